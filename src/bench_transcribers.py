@@ -0,0 +1,82 @@
+################
+# Runs a directory of WAV fixtures through each transcription backend and reports
+# real-time factor, latency and memory
+#
+#   python3 bench_transcribers.py fixtures/ --backends local stub openai
+#
+# Each backend runs in its own process so its memory use can be measured on its own.
+################
+
+import argparse
+import multiprocessing
+import os
+import resource
+import time
+import wave
+import settings
+from transcribers import create_transcriber
+
+def audio_seconds(file_path):
+    with wave.open(file_path, 'rb') as wav_file:
+        return wav_file.getnframes() / wav_file.getframerate()
+
+def _bench_backend(backend, file_paths):
+    """Runs in a child process. Returns the load time, per-file results and peak RSS in MB"""
+    try:
+        return _run_backend(backend, file_paths)
+    except Exception as e:
+        # some openai exceptions can't be unpickled in the parent and would hang pool.apply
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+
+def _run_backend(backend, file_paths):
+    start = time.perf_counter()
+    transcriber = create_transcriber(backend, settings.OPENAI_API_KEY)
+    load_seconds = time.perf_counter() - start
+
+    results = []
+    for file_path in file_paths:
+        with open(file_path, 'rb') as f:
+            wav_data = f.read()
+        start = time.perf_counter()
+        text = transcriber.transcribe(wav_data)
+        results.append((file_path, audio_seconds(file_path), time.perf_counter() - start, text))
+
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return load_seconds, results, peak_rss_mb
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('fixtures', help='Directory of WAV files')
+    parser.add_argument('--backends', nargs='+', default=['local', 'stub'], help='Transcribers to compare')
+    parser.add_argument('--show_text', action='store_true', help='Print each transcript')
+    args = parser.parse_args()
+
+    file_paths = sorted(os.path.join(args.fixtures, name) for name in os.listdir(args.fixtures)
+                        if name.lower().endswith('.wav'))
+    if len(file_paths) == 0:
+        print(f"No WAV files in {args.fixtures}")
+        return
+
+    print(f"{len(file_paths)} fixtures, {sum(audio_seconds(p) for p in file_paths):.1f}s of audio\n")
+    print("backend   load_s  audio_s  total_s    rtf  p50_latency_s  max_latency_s  peak_rss_mb")
+    for backend in args.backends:
+        with multiprocessing.Pool(1) as pool:
+            try:
+                load_seconds, results, peak_rss_mb = pool.apply(_bench_backend, [backend, file_paths])
+            except Exception as e:
+                print(f"{backend:8s}  failed: {e}")
+                continue
+
+        total_audio = sum(r[1] for r in results)
+        latencies = sorted(r[2] for r in results)
+        total_seconds = sum(latencies)
+        print(f"{backend:8s} {load_seconds:7.2f} {total_audio:8.1f} {total_seconds:8.2f} "
+              f"{total_seconds / total_audio:6.3f} {latencies[len(latencies) // 2]:14.2f} "
+              f"{latencies[-1]:14.2f} {peak_rss_mb:12.0f}")
+
+        if args.show_text:
+            for file_path, _, latency, text in results:
+                print(f"    {os.path.basename(file_path)} ({latency:.2f}s): {text}")
+
+if __name__ == '__main__':
+    main()
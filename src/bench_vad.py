@@ -0,0 +1,78 @@
+################
+# Measures the CPU cost of voice detection on recorded WAV fixtures
+#
+#   python3 bench_vad.py ../4mics_hat/recording_examples/output.wav
+#
+# Fixtures must be 16kHz 16-bit, only the first channel is used.
+################
+
+import argparse
+import time
+import wave
+from array import array
+import webrtcvad
+from voice_detection import EnergyGate, VoiceDetector
+
+SAMPLE_RATE = 16000
+FRAME_LENGTH = 480  # 30ms at 16kHz, same as main.py
+
+class WavReader:
+    """Serves the frames of a WAV fixture like a CaptureReader, as fast as they are read"""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.position = 0
+        self.frame_length = FRAME_LENGTH
+        self.capture_time = None
+
+    def read_batch(self, count):
+        if self.position + count > len(self.frames):
+            raise EOFError()
+        batch = self.frames[self.position:self.position + count]
+        self.position += count
+        self.capture_time = time.monotonic()
+        return batch
+
+def load_frames(file_path):
+    with wave.open(file_path, 'rb') as wav_file:
+        if wav_file.getframerate() != SAMPLE_RATE or wav_file.getsampwidth() != 2:
+            raise ValueError(f"{file_path} must be 16kHz 16-bit audio")
+        channels = wav_file.getnchannels()
+        samples = array('h', wav_file.readframes(wav_file.getnframes()))
+
+    samples = samples[::channels]
+    return [samples[i:i + FRAME_LENGTH] for i in range(0, len(samples) - FRAME_LENGTH + 1, FRAME_LENGTH)]
+
+def run_detector(frames, mode, batch_frames, gate):
+    detector = VoiceDetector(webrtcvad.Vad(mode), SAMPLE_RATE, batch_frames=batch_frames,
+                             gate=EnergyGate() if gate else None)
+    reader = WavReader(frames)
+    start = time.process_time()
+    try:
+        while True:
+            detector.wait(reader)
+    except EOFError:
+        pass
+    return detector, time.process_time() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('fixtures', nargs='+', help='WAV files to run through the detector')
+    parser.add_argument('--repeat', type=int, default=5, help='Times to run each fixture')
+    args = parser.parse_args()
+
+    for file_path in args.fixtures:
+        frames = load_frames(file_path) * args.repeat
+        audio_seconds = len(frames) * FRAME_LENGTH / SAMPLE_RATE
+        print(f"\n{file_path}: {audio_seconds:.1f}s of audio")
+        print("mode batch gate detections  gated  cpu_s  cpu_%_of_realtime  us/frame")
+        for mode in range(4):
+            for batch_frames in (1, 4, 8):
+                for gate in ((False, True) if EnergyGate.available() else (False,)):
+                    detector, cpu_seconds = run_detector(frames, mode, batch_frames, gate)
+                    print(f"{mode:4d} {batch_frames:5d} {'on' if gate else 'off':>4} {detector.detections:10d} "
+                          f"{detector.frames_gated:6d} {cpu_seconds:6.3f} "
+                          f"{100 * cpu_seconds / audio_seconds:18.3f} {1e6 * cpu_seconds / detector.frames_processed:9.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+################
+# Measures how long the viewer takes to pick an image for /image with a large database
+#
+#   python3 bench_view.py --entries 10000
+#
+# Compares the old approach (parse all of prompts.json per request), querying SQLite per
+# request, the viewer's cached ImageIndex, and the RotationScheduler the viewer answers from.
+################
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from image_db import ImageDB, ImageIndex
+from rotation import RotationScheduler
+
+def make_records(count):
+    start = datetime.now() - timedelta(days=count)
+    return [{
+        'prompt': f"A watercolor of conversation number {i}, soft light, muted colors, gallery framing",
+        'url': f"https://example.com/api/image/whisperframe/{i:08d}?code=abcdef",
+        'date': (start + timedelta(days=i)).isoformat(),
+        'name': f"Artist {i}"
+    } for i in range(count)]
+
+def pick_from_json(json_file):
+    """What view.get_random_url used to do for every request"""
+    with open(json_file, "rb") as f:
+        urls = json.load(f)
+    return random.choice(urls)
+
+def time_requests(label, pick, requests):
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        pick()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f"{label:22s} mean {1000 * sum(timings) / len(timings):8.3f}ms  "
+          f"p50 {1000 * timings[len(timings) // 2]:8.3f}ms  p99 {1000 * timings[int(len(timings) * 0.99)]:8.3f}ms")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--entries', type=int, default=10000, help='Images in the database')
+    parser.add_argument('--requests', type=int, default=500, help='Requests to time for each approach')
+    args = parser.parse_args()
+
+    records = make_records(args.entries)
+    with tempfile.TemporaryDirectory() as directory:
+        json_file = os.path.join(directory, "prompts.json")
+        with open(json_file, "w") as f:
+            json.dump(records, f, ensure_ascii=False, indent=4)
+        db = ImageDB(os.path.join(directory, "images.sqlite3"))
+        for record in records:
+            db.append(record)
+        index = ImageIndex(db)
+        rotation = RotationScheduler(index, 360, timedelta(minutes=30), datetime.min.time(), datetime.min.time())
+
+        print(f"{args.entries} images, {args.requests} requests each")
+        time_requests("json (old)", lambda: pick_from_json(json_file), args.requests)
+        time_requests("sqlite per request", lambda: (db.latest(), db.random()), args.requests)
+        time_requests("cached index", lambda: (index.latest(), index.random()), args.requests)
+        time_requests("rotation scheduler", rotation.current, args.requests)
+
+        # a new image arrives: the next request reloads, the ones after are cached again
+        db.append(make_records(1)[0])
+        time_requests("cached index, reload", lambda: (index.invalidate(), index.latest()), 20)
+
+if __name__ == '__main__':
+    main()
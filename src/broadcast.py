@@ -0,0 +1,98 @@
+import collections
+import json
+import threading
+import time
+
+CLIENT_QUEUE_SIZE = 8  # Messages waiting for one display before the oldest are dropped
+HEARTBEAT_INTERVAL = 25  # Seconds of quiet before a heartbeat is sent to keep the socket alive
+
+class ClientChannel:
+    """One WebSocket's outbound queue and the thread that writes it.
+
+    Only the newest pending message of each event type is kept, so a display that stalls gets the
+    latest image and state when it recovers rather than a backlog. A failed send closes the
+    channel.
+    """
+
+    def __init__(self, ws, on_closed, max_queue=CLIENT_QUEUE_SIZE, heartbeat_interval=HEARTBEAT_INTERVAL):
+        self.ws = ws
+        self.on_closed = on_closed
+        self.max_queue = max_queue
+        self.heartbeat_interval = heartbeat_interval
+        self.dropped = 0
+        self._messages = collections.deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="ws-writer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def send(self, event):
+        """Queue an event for this client. Never blocks"""
+        with self._condition:
+            if self._closed:
+                return
+            for pending in list(self._messages):
+                if pending["event"] == event["event"]:
+                    self._messages.remove(pending)
+                    self.dropped += 1
+            if len(self._messages) >= self.max_queue:
+                self._messages.popleft()
+                self.dropped += 1
+            self._messages.append(event)
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        self.on_closed(self)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if len(self._messages) == 0 and not self._closed:
+                    self._condition.wait(self.heartbeat_interval)
+                if self._closed:
+                    return
+                if len(self._messages) > 0:
+                    event = self._messages.popleft()
+                else:
+                    event = {"event": "heartbeat", "data": {}, "time": time.time()}
+
+            try:
+                self.ws.send(json.dumps(event))
+            except Exception:
+                self.close()
+                return
+
+class Broadcaster:
+    """Sends events to every connected display without letting a slow one hold up the others"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = set()
+
+    def add(self, ws):
+        channel = ClientChannel(ws, self.remove)
+        with self._lock:
+            self._channels.add(channel)
+        channel.start()
+        return channel
+
+    def remove(self, channel):
+        with self._lock:
+            self._channels.discard(channel)
+
+    def client_count(self):
+        with self._lock:
+            return len(self._channels)
+
+    def broadcast(self, event):
+        with self._lock:
+            channels = list(self._channels)
+        for channel in channels:
+            channel.send(event)
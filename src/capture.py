@@ -0,0 +1,110 @@
+import threading
+import time
+from array import array
+from pcm import pack_frame
+
+RING_BUFFER_SECONDS = 60  # How much audio we keep while consumers are busy (e.g. uploading)
+
+class CaptureReader:
+    """A consumer's position in the capture ring buffer. Reads frames in order, like PvRecorder.read()"""
+
+    def __init__(self, capture, position):
+        self.capture = capture
+        self.position = position
+        self.frame_length = capture.frame_length
+        self.capture_time = None  # time.monotonic() when the last frame read was captured
+
+    def read(self):
+        return self.read_batch(1)[0]
+
+    def read_batch(self, count):
+        """Wait for the next count frames and return them as a list"""
+        frames, self.capture_time, self.position = self.capture.read_frames(self.position, count)
+        return frames
+
+class AudioCapture:
+    """Reads PvRecorder frames continuously on a background thread into a preallocated ring buffer.
+
+    The recorder is started once and never stopped between listening and recording, so no audio
+    is lost while consumers switch modes or wait on the network. Consumers read through a
+    CaptureReader and catch up on anything captured while they were busy.
+    """
+
+    def __init__(self, recorder, sample_rate, buffer_seconds=RING_BUFFER_SECONDS):
+        self.recorder = recorder
+        self.frame_length = recorder.frame_length
+        self.capacity = int(buffer_seconds * sample_rate / self.frame_length)
+        self._buffer = array('h', bytes(2 * self.capacity * self.frame_length))
+        self._capture_times = array('d', bytes(8 * self.capacity))
+        self._frames_written = 0
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._error = None
+        self.dropped_frames = 0
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="audio-capture", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def reader(self):
+        """Return a reader that starts at the live edge of the capture"""
+        with self._condition:
+            return CaptureReader(self, self._frames_written)
+
+    def read_frames(self, position, count):
+        """Return (frames, capture_time, next_position), waiting until count frames from position
+        have been captured. capture_time is when the last of them was captured.
+
+        If the reader fell so far behind that its frames were overwritten, it skips ahead to the
+        oldest frame still in the buffer.
+        """
+        with self._condition:
+            while position + count > self._frames_written:
+                if not self._running:
+                    raise RuntimeError("Audio capture stopped") from self._error
+                self._condition.wait()
+
+            oldest = self._frames_written - self.capacity
+            if position < oldest:
+                self.dropped_frames += oldest - position
+                print("Capture overrun, skipped %d frames" % (oldest - position))
+                position = oldest
+
+            frames = []
+            for slot in range(position, position + count):
+                start = (slot % self.capacity) * self.frame_length
+                frames.append(self._buffer[start:start + self.frame_length])
+            capture_time = self._capture_times[(position + count - 1) % self.capacity]
+            return frames, capture_time, position + count
+
+    def _run(self):
+        try:
+            self.recorder.start()
+            while self._running:
+                pcm = self.recorder.read()
+                if len(pcm) != self.frame_length:
+                    raise ValueError("Expected %d samples from the recorder, got %d" % (self.frame_length, len(pcm)))
+                with self._condition:
+                    start = (self._frames_written % self.capacity) * self.frame_length
+                    pack_frame(pcm, self._buffer, start)
+                    self._capture_times[self._frames_written % self.capacity] = time.monotonic()
+                    self._frames_written += 1
+                    self._condition.notify_all()
+        except Exception as e:
+            print("Audio capture failed: ", e)
+            self._error = e
+        finally:
+            with self._condition:
+                self._running = False
+                self._condition.notify_all()
+            self.recorder.stop()
@@ -0,0 +1,58 @@
+import io
+from PIL import Image
+
+# Resized copies made of every cached image: name -> width in pixels. Generated images are 1536 wide
+SIZES = {"thumb": 384, "screen": 1280}
+DEFAULT_SIZE = "screen"
+FULL_SIZE = "full"  # the original download
+
+# Best first: (content type, Pillow format, file extension, save options). Formats this Pillow can't
+# write are skipped, AVIF needs Pillow 11.2 or later. JPEG is the fallback every browser can show.
+FORMATS = [
+    ("image/avif", "AVIF", "avif", {"quality": 60}),
+    ("image/webp", "WEBP", "webp", {"quality": 80, "method": 4}),
+    ("image/jpeg", "JPEG", "jpg", {"quality": 85, "progressive": True, "optimize": True}),
+]
+FALLBACK_CONTENT_TYPE = "image/jpeg"
+
+def available_formats():
+    Image.init()
+    return [f for f in FORMATS if f[1] in Image.SAVE]
+
+def make_derivatives(data):
+    """Resize image data to each of SIZES and encode it in each available format.
+    Returns a list of (size, content_type, extension, bytes)
+    """
+    derivatives = []
+    formats = available_formats()
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGB")
+        for size, width in SIZES.items():
+            width = min(width, image.width)
+            height = round(image.height * width / image.width)
+            resized = image.resize((width, height), Image.LANCZOS)
+            for content_type, image_format, extension, options in formats:
+                out = io.BytesIO()
+                resized.save(out, image_format, **options)
+                derivatives.append((size, content_type, extension, out.getvalue()))
+    return derivatives
+
+def size_for_width(width):
+    """The smallest size at least width pixels wide, or FULL_SIZE if none are big enough"""
+    for size, size_width in sorted(SIZES.items(), key=lambda item: item[1]):
+        if size_width >= width:
+            return size
+    return FULL_SIZE
+
+def choose(variants, size, accepted):
+    """Pick the file to send from a cache entry's variants ({size: {content_type: file name}}).
+    accepted is the set of content types the client listed in its Accept header.
+    Returns (file name, content type), or None to send the original.
+    """
+    by_type = variants.get(size)
+    if not by_type:
+        return None
+    for content_type, _, _, _ in FORMATS:
+        if content_type in by_type and (content_type in accepted or content_type == FALLBACK_CONTENT_TYPE):
+            return by_type[content_type], content_type
+    return None
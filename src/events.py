@@ -0,0 +1,79 @@
+import json
+import os
+import socket
+import threading
+import time
+import settings
+
+# Events sent from the generator process (main.py) to the viewer (view.py)
+NEW_IMAGE = "new_image"    # data: the saved image record (prompt, url, date, name)
+GENERATING = "generating"  # data: {}
+LISTENING = "listening"    # data: {}
+ERROR = "error"            # data: {"message": str}
+# Sent the other way, from the viewer to main.py on JOB_EVENT_SOCKET
+JOB_UPDATE = "job_update"  # data: {"token": from the callback URL, "job": the image endpoint's job status}
+EVENT_TYPES = (NEW_IMAGE, GENERATING, LISTENING, ERROR, JOB_UPDATE)
+
+MAX_EVENT_SIZE = 65536
+
+def make_event(event, data=None):
+    if event not in EVENT_TYPES:
+        raise ValueError(f"Unknown event: {event}")
+    return {"event": event, "data": data or {}, "time": time.time()}
+
+class EventPublisher:
+    """Sends events as JSON datagrams to a Unix socket.
+
+    Sending never blocks: if the viewer isn't running (or is behind) the event is dropped,
+    the viewer picks up current state from the database when it starts.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        self._failing = False
+
+    def publish(self, event, data=None):
+        message = json.dumps(make_event(event, data)).encode("utf-8")
+        try:
+            self._socket.sendto(message, self.path)
+            self._failing = False
+        except OSError as e:
+            # FileNotFoundError / ConnectionRefusedError: nobody listening, BlockingIOError: listener is behind
+            if not self._failing:
+                print(f"Warning: Failed to send {event} event to view app: {e}")
+            self._failing = True
+
+class EventListener:
+    """Receives events from an EventPublisher and passes each one to on_event on a background thread"""
+
+    def __init__(self, path, on_event):
+        self.path = path
+        self.on_event = on_event
+        if os.path.exists(path):
+            os.unlink(path)  # left over from a previous run
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(path)
+        self._thread = threading.Thread(target=self._run, name="event-listener", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            message = self._socket.recv(MAX_EVENT_SIZE)
+            try:
+                event = json.loads(message)
+                self.on_event(event)
+            except Exception as e:
+                print(f"Warning: Failed to handle event: {e}")
+
+_publisher = None
+
+def publish(event, data=None):
+    """Send an event to the viewer on the EVENT_SOCKET path"""
+    global _publisher
+    if _publisher is None:
+        _publisher = EventPublisher(settings.EVENT_SOCKET)
+    _publisher.publish(event, data)
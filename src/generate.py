@@ -1,33 +1,55 @@
 import openai
-import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import settings
 from image_generators import CustomAIGenerator, ModerationBlockedException
-import requests
-import view
+import events
+
+UNKNOWN_ARTIST = "Unknown Artist"  # used if naming fails, so a finished image isn't thrown away
 
 def read_all(filename):
     with open(filename, "r") as f:
         return f.read()
 
-def get_last_lines(transcript_file, num_of_lines):
-    with open(transcript_file, "r") as f:
-        lines = f.readlines()
-        return "\n".join(lines[-num_of_lines:])
+class PromptTemplates:
+    """The files in prompts/, read once and read again only when they change on disk"""
 
-def _notify_view_app(data):
-    """Send notification to view.py about new image via HTTP request"""
-    try:
-        response = requests.post(
-            "http://localhost:5000/_internal/notify_new_image",
-            json=data,
-            timeout=2  # Short timeout for local request
-        )
-        response.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        print(f"Warning: Failed to notify view app about new image: {e}")
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._cache = {}  # name -> ((mtime_ns, size), text)
+
+    def get(self, name):
+        path = os.path.join(self.directory, name)
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._cache.get(name)
+            if cached is None or cached[0] != signature:
+                cached = (signature, read_all(path))
+                self._cache[name] = cached
+            return cached[1]
+
+templates = PromptTemplates("prompts")
+
+_generator = None
 
-def save_image(prompt, url, artist_name, db_file):
+def get_generator():
+    """The image generator, made once so its connection and circuit breaker are kept between images"""
+    global _generator
+    if _generator is None:
+        _generator = CustomAIGenerator(settings.CUSTOM_AI_ENDPOINT, settings.CUSTOM_AI_CODE,
+                                       settings.CUSTOM_AI_CONNECT_TIMEOUT, settings.CUSTOM_AI_READ_TIMEOUT,
+                                       mode=settings.CUSTOM_AI_MODE, callback_url=settings.CUSTOM_AI_CALLBACK_URL)
+    return _generator
+
+def job_update(data):
+    """An image job callback passed on by the viewer"""
+    get_generator().job_update(data)
+
+def save_image(prompt, url, artist_name, image_db):
     data = {
         'prompt': prompt,
         'url': url,
@@ -35,20 +57,10 @@ def save_image(prompt, url, artist_name, db_file):
         'name': artist_name
     }
 
-    existing_data = list()
-    try:
-        with open(db_file, "r") as f:
-            existing_data = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        existing_data = list()
-
-    existing_data.append(data)
+    image_db.append(data)
 
-    with open(db_file, "w") as f:
-        json.dump(existing_data, f, ensure_ascii=False, indent=4)
-        
-    # Notify view.py about the new image via HTTP
-    _notify_view_app(data)
+    # Notify view.py about the new image
+    events.publish(events.NEW_IMAGE, data)
 
 def rewrite_prompt_for_safety(client, original_prompt):
     """Rewrite a prompt that was rejected by the safety system"""
@@ -71,37 +83,64 @@ def rewrite_prompt_for_safety(client, original_prompt):
         print(f"Error during prompt rewriting: {e}")
         return None
 
-def run(openai_api_key, num_of_lines, db_file, transcript_file):
-    client = openai.OpenAI(api_key=openai_api_key)
-    lines = get_last_lines(transcript_file, num_of_lines)
-    print("* Summarizing")
+def summarize(client, lines):
     r = client.chat.completions.create(
       model="gpt-4.1",
       messages=[
-        {"role": "system", "content": read_all("prompts/system.txt")},
-        {"role": "user", "content": read_all("prompts/example_1.txt")},
-        {"role": "assistant", "content": read_all("prompts/example_result_1.txt")},
+        {"role": "system", "content": templates.get("system.txt")},
+        {"role": "user", "content": templates.get("example_1.txt")},
+        {"role": "assistant", "content": templates.get("example_result_1.txt")},
         {"role": "user", "content": lines}
       ]
     )
+    return r.choices[0].message.content
 
-    prompt = r.choices[0].message.content
-    print("* Prompt:")
-    print(prompt)
-
-    print("* Naming")
+def name_artist(client, prompt):
     r = client.chat.completions.create(
         model="gpt-4.1",
         messages=[
-            {"role": "system", "content": read_all("prompts/name_system.txt")},
+            {"role": "system", "content": templates.get("name_system.txt")},
             {"role": "user", "content": prompt}
         ]
     )
     artist_name = r.choices[0].message.content
     print("* Name:")
     print(artist_name)
+    return artist_name
+
+def run(openai_api_key, num_of_lines, image_db, transcript):
+    """Make an image from the last num_of_lines of the transcript, returns True if one was saved"""
+    client = openai.OpenAI(api_key=openai_api_key)
+    lines = "\n".join(transcript.last_lines(num_of_lines))
+    events.publish(events.GENERATING)
+    print("* Summarizing")
+    prompt = summarize(client, lines)
+    print("* Prompt:")
+    print(prompt)
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="naming") as executor:
+        # the name only depends on the prompt, so it's made while the image is generated
+        print("* Naming")
+        naming = executor.submit(name_artist, client, prompt)
+        print("* Generating")
+        result = generate_image(client, prompt)
+        if result is None:
+            print("Image generation ultimately failed.")
+            return False
+        image_prompt, imgurl = result
+        try:
+            artist_name = naming.result()
+        except Exception as e:
+            print(f"Naming failed, saving as {UNKNOWN_ARTIST}: {e}")
+            artist_name = UNKNOWN_ARTIST
+
+    save_image(image_prompt, imgurl, artist_name, image_db)
+    return True
 
-    print("* Generating")
+def generate_image(client, prompt):
+    """Generate an image for prompt, rewriting it once if the safety system blocks it.
+    Returns (the prompt that was used, image url), or None if it failed
+    """
     current_prompt_being_tried = prompt
     safety_rewrites_performed = 0
     MAX_SAFETY_REWRITES = 1  # Allow one rewrite attempt
@@ -109,11 +148,9 @@ def run(openai_api_key, num_of_lines, db_file, transcript_file):
     while True:  # Loop for safety rewrites
         print(f"Attempting to generate image with prompt: '{current_prompt_being_tried}' (Rewrite #{safety_rewrites_performed})")
         try:
-            generator = CustomAIGenerator(settings.CUSTOM_AI_ENDPOINT, settings.CUSTOM_AI_CODE)
-            imgurl = generator.generate(current_prompt_being_tried)  # Has internal retries for network/500 errors
-            save_image(current_prompt_being_tried, imgurl, artist_name, db_file)
+            imgurl = get_generator().generate(current_prompt_being_tried)  # Has internal retries for network/500 errors
             print("  Image generated successfully.")
-            return  # SUCCESS
+            return current_prompt_being_tried, imgurl  # SUCCESS
         except ModerationBlockedException as mbe:
             print(f"  Moderation system blocked prompt: {mbe.original_prompt}")
             if safety_rewrites_performed < MAX_SAFETY_REWRITES:
@@ -125,25 +162,25 @@ def run(openai_api_key, num_of_lines, db_file, transcript_file):
                     continue  # Try the new prompt
                 else:
                     print("  Rewrite failed or produced the same prompt. Aborting.")
-                    return  # FAILURE
+                    return None  # FAILURE
             else:
                 print("  Max safety rewrites reached. Aborting.")
-                return  # FAILURE
+                return None  # FAILURE
         except Exception as e:  # Other errors from generator.generate() after its internal retries
             print(f"  Image generation failed for prompt '{current_prompt_being_tried}': {e}")
             # If a prompt version fails with a general error, we give up on it.
             # If no more rewrites are allowed, we give up entirely.
             if safety_rewrites_performed >= MAX_SAFETY_REWRITES:
                 print("  No more safety rewrites possible. Aborting.")
-                return  # FAILURE
+                return None  # FAILURE
             else:
                 # This means the current prompt failed its attempt.
                 # We only rewrite on ModerationBlocked. So, if a prompt fails general attempts, it's done.
                 print(f"  Prompt '{current_prompt_being_tried}' failed. Aborting as we only rewrite on moderation blocks.")
-                return  # FAILURE
+                return None  # FAILURE
         
         # Should not be reached if logic is correct
         if safety_rewrites_performed >= MAX_SAFETY_REWRITES:  # Ensure loop terminates
             break
     
-    print("Image generation ultimately failed.")  # Fallback message
+    return None
@@ -0,0 +1,79 @@
+import threading
+
+class GenerationRunner:
+    """Runs image generation on a background thread so listening and transcription carry on.
+
+    At most one generation runs at a time. Requests that arrive while one is running set a pending
+    flag instead of queueing, so however many arrive only one more generation follows, made from
+    the transcript as it is when that generation starts. generate returns True if an image was
+    made. on_start() and on_finish(succeeded) are called from the runner's thread around each
+    generation, to show what it's doing.
+    """
+
+    def __init__(self, generate, on_start=None, on_finish=None):
+        self.generate = generate
+        self.on_start = on_start
+        self.on_finish = on_finish
+        self.completed = 0
+        self.failed = 0
+        self.coalesced = 0  # requests folded into one that was already pending
+        self._condition = threading.Condition()
+        self._pending = False
+        self._running = False
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="generation", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop after the current generation, if any, and drop a pending one"""
+        with self._condition:
+            self._stopped = True
+            self._pending = False
+            self._condition.notify()
+        self._thread.join(timeout)
+
+    def request(self):
+        """Ask for a new image. Never blocks"""
+        with self._condition:
+            if self._pending:
+                self.coalesced += 1
+            self._pending = True
+            self._condition.notify()
+
+    def busy(self):
+        with self._condition:
+            return self._running or self._pending
+
+    def _report(self, callback, *args):
+        if callback is None:
+            return
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"Warning: Failed to report generation state: {e}")
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                self._pending = False
+                self._running = True
+
+            self._report(self.on_start)
+            succeeded = False
+            try:
+                succeeded = bool(self.generate())
+            except Exception as e:
+                print(f"Image generation failed: {e}")
+            with self._condition:
+                self._running = False
+            if succeeded:
+                self.completed += 1
+            else:
+                self.failed += 1
+            self._report(self.on_finish, succeeded)
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+import requests
+import derivatives
+
+DOWNLOAD_TIMEOUT = (5, 60)  # (connect, read) seconds
+
+class ImageCache:
+    """Local copies of generated images, so displays don't download them from the blob store on
+    every rotation.
+
+    Files are stored under the sha256 of their content and never change, so they can be served
+    with long cache lifetimes. Resized copies in smaller formats (see derivatives.py) are made when
+    an image is downloaded and stored alongside it. An index maps each remote URL to its files.
+    When the cache grows past max_bytes the least recently used images are deleted.
+    """
+
+    def __init__(self, directory, max_bytes):
+        # absolute, Flask's send_file resolves relative paths against the app's directory instead
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self._index_file = os.path.join(self.directory, "index.json")
+        self._lock = threading.Lock()
+        self._entries = {}  # url -> {"digest", "size", "content_type", "variants", "used"}
+        self._downloads = queue.Queue()
+        self._queued = set()
+
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            with open(self._index_file, "r") as f:
+                entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            entries = {}
+        self._entries = {url: entry for url, entry in entries.items() if os.path.exists(self.path(entry["digest"]))}
+
+        self._thread = threading.Thread(target=self._run, name="image-cache", daemon=True)
+        self._thread.start()
+
+    def path(self, digest):
+        return os.path.join(self.directory, digest)
+
+    def get(self, url):
+        """The cache entry for url, or None if it hasn't been downloaded"""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                entry["used"] = time.time()
+            return entry
+
+    def by_digest(self, digest):
+        """The cache entry for an image's original file, or None"""
+        with self._lock:
+            for entry in self._entries.values():
+                if entry["digest"] == digest:
+                    return entry
+        return None
+
+    def fetch(self, url):
+        """Download url into the cache, if it isn't already there, and return its entry"""
+        entry = self.get(url)
+        if entry is not None:
+            return entry
+
+        resp = requests.get(url, timeout=DOWNLOAD_TIMEOUT)
+        resp.raise_for_status()
+        digest = hashlib.sha256(resp.content).hexdigest()
+        temp_path = self.path(digest) + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(resp.content)
+        os.replace(temp_path, self.path(digest))
+        variants, variants_size = self._make_derivatives(digest, resp.content)
+
+        entry = {
+            "digest": digest,
+            "size": len(resp.content) + variants_size,
+            "content_type": resp.headers.get("Content-Type", "application/octet-stream"),
+            "variants": variants,
+            "used": time.time()
+        }
+        with self._lock:
+            self._entries[url] = entry
+            self._evict(keep=url)
+            self._save_index()
+        return entry
+
+    def _make_derivatives(self, digest, data):
+        """Write the resized copies of an image, returns ({size: {content_type: file name}}, total bytes)"""
+        variants = {}
+        total = 0
+        try:
+            made = derivatives.make_derivatives(data)
+        except Exception as e:
+            print(f"Warning: Failed to resize image {digest}, displays will get the original: {e}")
+            return variants, total
+        for size, content_type, extension, image_data in made:
+            name = f"{digest}-{size}.{extension}"
+            temp_path = self.path(name) + ".tmp"
+            with open(temp_path, "wb") as f:
+                f.write(image_data)
+            os.replace(temp_path, self.path(name))
+            variants.setdefault(size, {})[content_type] = name
+            total += len(image_data)
+        return variants, total
+
+    def prefetch(self, url):
+        """Download url in the background"""
+        with self._lock:
+            if url in self._entries or url in self._queued:
+                return
+            self._queued.add(url)
+        self._downloads.put(url)
+
+    def _run(self):
+        while True:
+            url = self._downloads.get()
+            try:
+                self.fetch(url)
+            except Exception as e:
+                print(f"Warning: Failed to cache image {url}: {e}")
+            finally:
+                with self._lock:
+                    self._queued.discard(url)
+
+    def _evict(self, keep):
+        """Delete least recently used images, other than keep, until the cache fits in max_bytes"""
+        # identical images share a file, only count it once
+        sizes = {entry["digest"]: entry["size"] for entry in self._entries.values()}
+        total = sum(sizes.values())
+        for url, entry in sorted(self._entries.items(), key=lambda item: item[1]["used"]):
+            if total <= self.max_bytes:
+                break
+            if url == keep:
+                continue
+            del self._entries[url]
+            if not any(other["digest"] == entry["digest"] for other in self._entries.values()):
+                total -= entry["size"]
+                os.remove(self.path(entry["digest"]))
+                for by_type in entry.get("variants", {}).values():
+                    for name in by_type.values():
+                        os.remove(self.path(name))
+
+    def _save_index(self):
+        temp_file = self._index_file + ".tmp"
+        with open(temp_file, "w") as f:
+            json.dump(self._entries, f)
+        os.replace(temp_file, self._index_file)
@@ -0,0 +1,181 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    prompt TEXT,
+    url TEXT,
+    date TEXT,
+    name TEXT,
+    favorite INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS images_date ON images (date);
+"""
+
+class ImageDB:
+    """The generated images, stored in SQLite.
+
+    Records are dicts with the same shape as the entries of the old prompts.json: prompt, url,
+    date and name. Appending is a single insert, and latest, random and by-date lookups use the
+    primary key or the date index instead of loading every record. The generator, viewer and
+    stats script each open their own ImageDB on the same file.
+    """
+
+    def __init__(self, db_file, legacy_file=None):
+        self.db_file = db_file
+        os.makedirs(os.path.dirname(db_file) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_file, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._conn.executescript(SCHEMA)
+        self._add_favorite_column()
+        if legacy_file is not None and os.path.exists(legacy_file):
+            self._migrate(legacy_file)
+
+    @staticmethod
+    def _record(row):
+        if row is None:
+            return None
+        return {'prompt': row['prompt'], 'url': row['url'], 'date': row['date'], 'name': row['name']}
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def append(self, record):
+        with self._lock:
+            self._conn.execute("INSERT INTO images (prompt, url, date, name) VALUES (?, ?, ?, ?)",
+                               (record['prompt'], record['url'], record['date'], record['name']))
+
+    def set_favorite(self, url, favorite=True):
+        """Mark an image as a favorite (shown more often), returns False if there is no such image"""
+        with self._lock:
+            cursor = self._conn.execute("UPDATE images SET favorite = ? WHERE url = ?", (int(favorite), url))
+        return cursor.rowcount > 0
+
+    def favorite_urls(self):
+        return {row[0] for row in self._query("SELECT url FROM images WHERE favorite")}
+
+    def count(self):
+        return self._query("SELECT COUNT(*) FROM images")[0][0]
+
+    def first(self):
+        rows = self._query("SELECT * FROM images ORDER BY id LIMIT 1")
+        return self._record(rows[0]) if rows else None
+
+    def latest(self):
+        rows = self._query("SELECT * FROM images ORDER BY id DESC LIMIT 1")
+        return self._record(rows[0]) if rows else None
+
+    def random(self, rng=random):
+        """Pick a random image by jumping to a random id, so it doesn't scan the table"""
+        low, high = self._query("SELECT MIN(id), MAX(id) FROM images")[0]
+        if low is None:
+            return None
+        rows = self._query("SELECT * FROM images WHERE id >= ? ORDER BY id LIMIT 1", (rng.randint(low, high),))
+        return self._record(rows[0])
+
+    def by_date(self, start, end):
+        """Images generated from start (inclusive) to end (exclusive), as ISO date strings"""
+        rows = self._query("SELECT * FROM images WHERE date >= ? AND date < ? ORDER BY date", (start, end))
+        return [self._record(row) for row in rows]
+
+    def all(self):
+        return [self._record(row) for row in self._query("SELECT * FROM images ORDER BY id")]
+
+    def after(self, last_id):
+        """(id, record) for every image added after last_id, oldest first"""
+        rows = self._query("SELECT * FROM images WHERE id > ? ORDER BY id", (last_id,))
+        return [(row['id'], self._record(row)) for row in rows]
+
+    def file_signature(self):
+        """Changes whenever another process commits to the database (or replaces the file)"""
+        stat = os.stat(self.db_file)
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def count_by_month(self):
+        """{"YYYY-MM": count}, oldest month first"""
+        rows = self._query("SELECT substr(date, 1, 7) AS month, COUNT(*) FROM images GROUP BY month ORDER BY month")
+        return {row[0]: row[1] for row in rows}
+
+    def _add_favorite_column(self):
+        """Databases made before favorites existed don't have the column"""
+        with self._lock:
+            columns = [row['name'] for row in self._conn.execute("PRAGMA table_info(images)")]
+            if 'favorite' not in columns:
+                try:
+                    self._conn.execute("ALTER TABLE images ADD COLUMN favorite INTEGER NOT NULL DEFAULT 0")
+                except sqlite3.OperationalError:
+                    pass  # another process added it first
+
+    def _migrate(self, legacy_file):
+        """Import the old prompts.json once, if the database is still empty"""
+        try:
+            with open(legacy_file, "r") as f:
+                records = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            records = []
+
+        with self._lock:
+            # BEGIN IMMEDIATE so only one process migrates if several start at once
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._conn.execute("SELECT COUNT(*) FROM images").fetchone()[0] == 0:
+                    print(f"Migrating {len(records)} images from {legacy_file} into {self.db_file}")
+                    self._conn.executemany(
+                        "INSERT INTO images (prompt, url, date, name) VALUES (?, ?, ?, ?)",
+                        [(r.get('prompt'), r.get('url'), r.get('date'), r.get('name')) for r in records])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        try:
+            os.rename(legacy_file, legacy_file + ".migrated")
+        except FileNotFoundError:
+            pass  # another process migrated it first
+
+class ImageIndex:
+    """All image records held in memory for the viewer, refreshed only when the database changes.
+
+    Each lookup costs one stat() of the database file. When it has changed only the new rows are
+    read, since images are only ever appended. The generator's new image notification can also
+    call invalidate() to force a refresh on the next lookup.
+    """
+
+    def __init__(self, image_db):
+        self.image_db = image_db
+        self._records = []
+        self._last_id = 0
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._signature = None
+
+    def records(self):
+        with self._lock:
+            signature = self.image_db.file_signature()
+            if signature != self._signature:
+                if self._signature is not None and signature[0] != self._signature[0]:
+                    # the database file was replaced, start over
+                    self._records = []
+                    self._last_id = 0
+                for image_id, record in self.image_db.after(self._last_id):
+                    self._records.append(record)
+                    self._last_id = image_id
+                self._signature = signature
+            return self._records
+
+    def latest(self):
+        records = self.records()
+        return records[-1] if records else None
+
+    def random(self, rng=random):
+        records = self.records()
+        return rng.choice(records) if records else None
@@ -1,7 +1,28 @@
 import io
+import random
 import requests
+import secrets
+import threading
 import time
 from abc import ABC, abstractmethod
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from urllib3.util.retry import Retry
+
+CONNECT_TIMEOUT = 10   # Seconds to connect to the image endpoint
+READ_TIMEOUT = 300     # Seconds to wait for a response, generating an image can take minutes
+MAX_RETRIES = 3
+INITIAL_RETRY_WAIT = 10
+MAX_RETRY_WAIT = 300   # Longest wait between retries, including one asked for by Retry-After
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+BREAKER_THRESHOLD = 3  # Failed generations in a row before we stop calling the endpoint...
+BREAKER_COOLDOWN = 600  # ...for this many seconds
+JOB_TIMEOUT = 900      # Seconds a submitted job (poll and callback modes) can take before we give up on it
+POLL_INITIAL_INTERVAL = 2
+POLL_MAX_INTERVAL = 30
+CALLBACK_FALLBACK_POLL = 60  # In callback mode, poll this often in case a callback gets lost
+MODES = ("sync", "poll", "callback")
 
 class ModerationBlockedException(Exception):
     """Raised when an image generation request is blocked by the safety system"""
@@ -9,6 +30,9 @@ class ModerationBlockedException(Exception):
         super().__init__(message)
         self.original_prompt = original_prompt
 
+class CircuitOpenException(Exception):
+    """Raised instead of calling an endpoint that has been failing"""
+
 class ImageGenerator(ABC):
     """Base class for image generation providers"""
     
@@ -17,80 +41,276 @@ class ImageGenerator(ABC):
         """Generate an image and return its URL"""
         pass
 
+class CircuitBreaker:
+    """Stops calls to an endpoint after it fails threshold times in a row.
+
+    After cooldown seconds one call is let through to test it: if that succeeds calls carry on as
+    normal, if it fails the breaker stays open for another cooldown.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def check(self):
+        """Raise CircuitOpenException if calls aren't allowed right now"""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self._opened_at + self.cooldown - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenException(f"Endpoint failed {self.failures} times in a row, not retrying for {remaining:.0f}s")
+            # let this call through as a test, the next failure reopens the breaker
+            self._opened_at = None
+            self.failures = self.threshold - 1
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+def retry_after(resp):
+    """Seconds a response's Retry-After header asks us to wait, or None"""
+    value = resp.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+def never_sent(error):
+    """True if a request failed before a connection to the endpoint was made, so it can't have
+    been received. Other ConnectionErrors, like a connection dropped after a POST was sent, may
+    have reached the endpoint"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        return isinstance(getattr(error.args[0], "reason", error.args[0]), NewConnectionError)
+    return False
+
 class CustomAIGenerator(ImageGenerator):
-    """Custom AI image generator implementation"""
+    """Custom AI image generator implementation.
+
+    Keep one instance for the life of the program: requests go through a pooled Session so the
+    connection to the endpoint is reused, and its circuit breaker remembers recent failures.
+    Server errors and network errors are retried with jittered exponential backoff, or after
+    however long the server's Retry-After header asks for.
+
+    In "sync" mode one POST is held open until the image is made. In "poll" and "callback" modes
+    the job is submitted and we get a job id back straight away (see custom_ai_image_generator.md);
+    "poll" then checks on it with backoff, "callback" waits for the endpoint to post the result to
+    callback_url (passed on to job_update()) and only polls occasionally in case it gets lost.
+    generate() can be called from several threads at once.
+    """
     
-    def __init__(self, endpoint_url: str, auth_code: str):
+    def __init__(self, endpoint_url: str, auth_code: str, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 max_retries=MAX_RETRIES, initial_wait=INITIAL_RETRY_WAIT, breaker=None, mode="sync",
+                 callback_url=None, job_timeout=JOB_TIMEOUT):
         if not auth_code:
             raise ValueError("No auth code provided for Custom AI endpoint")
+        if mode not in MODES:
+            raise ValueError(f"Unknown Custom AI mode: {mode}")
+        if mode == "callback" and not callback_url:
+            raise ValueError("No callback URL provided for Custom AI callback mode")
         self.endpoint_url = endpoint_url.rstrip('/')
         self.auth_code = auth_code
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.initial_wait = initial_wait
+        self.breaker = breaker or CircuitBreaker()
+        self.mode = mode
+        self.callback_url = callback_url.rstrip('/') if callback_url else None
+        self.job_timeout = job_timeout
+        self.session = requests.Session()
+        # urllib3 replaces pooled keep-alive connections the endpoint has closed before reusing
+        # them; past that it may retry a connect once, but never resends a request it may have read
+        self.session.mount(self.endpoint_url, HTTPAdapter(
+            pool_connections=1, pool_maxsize=4, max_retries=Retry(total=1, connect=1, read=0, status=0, redirect=False)))
+        self._waiters = {}  # callback token -> {"event": threading.Event, "job": latest job status}
+        self._waiters_lock = threading.Lock()
+
+    def _retry_wait(self, attempt, resp=None):
+        wait = retry_after(resp) if resp is not None else None
+        if wait is None:
+            # exponential backoff, jittered so devices that failed together don't retry together
+            wait = self.initial_wait * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+        return min(wait, MAX_RETRY_WAIT)
+
+    def _image_url(self, image_path):
+        # Add code parameter to image URL
+        image_url = f"{self.endpoint_url}/{image_path}?code={self.auth_code}"
+        print(image_url)
+        return image_url
         
     def generate(self, prompt: str) -> str:
-        url = f"{self.endpoint_url}/api/GenerateImage?code={self.auth_code}"
-        data = {
+        self.breaker.check()
+        try:
+            if self.mode == "sync":
+                image_url = self._generate(prompt)
+            else:
+                image_url = self._generate_job(prompt)
+        except ModerationBlockedException:
+            self.breaker.success()  # the endpoint is working, it just didn't like the prompt
+            raise
+        except Exception:
+            self.breaker.failure()
+            raise
+        self.breaker.success()
+        return image_url
+
+    def job_update(self, data):
+        """A job status posted to our callback URL: {"token": from the callback URL, "job": the status}"""
+        with self._waiters_lock:
+            waiter = self._waiters.get(data.get("token"))
+            if waiter is None:
+                print("Ignoring callback for unknown image job")
+                return
+            waiter["job"] = data.get("job")
+        waiter["event"].set()
+
+    def _request_data(self, prompt):
+        return {
             "group": "whisperframe",
             "type": "raw",
             "size": "1536x1024",
             "details": prompt
         }
+
+    def _generate(self, prompt):
+        url = f"{self.endpoint_url}/api/GenerateImage?code={self.auth_code}"
+        data = self._request_data(prompt)
         print(url)
         print(data)
-        
-        max_retries = 3
-        initial_wait = 10
+        result = self._request("POST", url, prompt, json=data).json()
+        print(result)
+        return self._image_url(result['imageUrl'])
+
+    def _generate_job(self, prompt):
+        data = self._request_data(prompt)
+        waiter = None
+        if self.mode == "callback":
+            token = secrets.token_urlsafe(16)
+            data["callbackUrl"] = f"{self.callback_url}/jobs/callback/{token}"
+            waiter = {"event": threading.Event(), "job": None}
+            with self._waiters_lock:
+                self._waiters[token] = waiter
+        try:
+            print(data)
+            job = self._request("POST", f"{self.endpoint_url}/api/jobs?code={self.auth_code}", prompt, json=data).json()
+            print(f"Submitted image job {job['jobId']}")
+            return self._wait_for_job(job["jobId"], prompt, waiter)
+        finally:
+            if waiter is not None:
+                with self._waiters_lock:
+                    del self._waiters[token]
+
+    def _wait_for_job(self, job_id, prompt, waiter):
+        deadline = time.monotonic() + self.job_timeout
+        interval = POLL_INITIAL_INTERVAL
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise Exception(f"Image job {job_id} did not finish within {self.job_timeout}s")
+            if waiter is not None:
+                waiter["event"].wait(min(CALLBACK_FALLBACK_POLL, remaining))
+                waiter["event"].clear()
+                with self._waiters_lock:
+                    job, waiter["job"] = waiter["job"], None
+                if job is None:
+                    job, _ = self._poll(job_id, prompt)
+            else:
+                time.sleep(min(interval, remaining))
+                job, wait = self._poll(job_id, prompt)
+                # the endpoint can say when to check again, otherwise back off
+                interval = wait if wait is not None else min(interval * 1.5, POLL_MAX_INTERVAL)
+
+            status = job.get("status")
+            if status == "Complete":
+                print(job)
+                return self._image_url(job["imageUrl"])
+            if status == "Failed":
+                error = job.get("error") or {}
+                if error.get("code") == "moderation_blocked":
+                    raise ModerationBlockedException(error.get("message", "Blocked"), prompt)
+                raise Exception(f"Image job {job_id} failed: {error.get('message', job)}")
+            print(f"Image job {job_id} is {status}")
+
+    def _poll(self, job_id, prompt):
+        """The job's status, and how long the endpoint wants us to wait before asking again"""
+        resp = self._request("GET", f"{self.endpoint_url}/api/jobs/{job_id}?code={self.auth_code}", prompt)
+        return resp.json(), retry_after(resp)
+
+    def _request(self, method, url, prompt, **kwargs):
+        """Send a request to the endpoint, retrying server and network errors. Returns the 2xx response.
+
+        POSTs are only retried after network errors if they never_sent: one that timed out or lost
+        its connection may have reached the endpoint and still be generating, and sending it again
+        would pay for the image twice. GETs are retried after any connection error or timeout."""
         attempt = 0
         
-        while attempt <= max_retries:
+        while attempt <= self.max_retries:
             try:
-                resp = requests.post(url, json=data)
+                resp = self.session.request(method, url, timeout=self.timeout, **kwargs)
                 
                 if 200 <= resp.status_code < 300:
-                    result = resp.json()
-                    print(result)
-                    # Add code parameter to image URL
-                    image_url = f"{self.endpoint_url}/{result['imageUrl']}?code={self.auth_code}"
-                    print(image_url)
-                    return image_url
+                    return resp
                 
                 # For any non-2xx response, first check if it's a moderation block
                 try:
                     error_data = resp.json()
                     if error_data.get("error", {}).get("code") == "moderation_blocked":
                         raise ModerationBlockedException(error_data["error"]["message"], prompt)
-                except (ValueError, KeyError):
+                except (ValueError, KeyError, AttributeError):
                     # Not a JSON response or not the moderation error format,
                     # so it's not a moderation_blocked error we can parse.
                     # Proceed to check status code for other errors.
                     pass 
                 
-                # Now handle specific status codes like 500 for retries,
+                # Now handle server errors and rate limiting for retries,
                 # or other errors.
-                if resp.status_code == 500:
-                    # If we are here, it means it was a 500 but NOT a moderation_blocked error
+                if resp.status_code in RETRY_STATUS_CODES:
+                    # If we are here, it was NOT a moderation_blocked error
                     # (or if it was, ModerationBlockedException was already raised).
                     attempt += 1
-                    if attempt > max_retries:
-                        raise Exception(f"Max retries ({max_retries}) exceeded for 500 error. Last error: {resp.text}")
+                    if attempt > self.max_retries:
+                        raise Exception(f"Max retries ({self.max_retries}) exceeded for {resp.status_code} error. Last error: {resp.text}")
                     
-                    wait_time = initial_wait * (2 ** (attempt - 1))  # exponential backoff
-                    print(f"Got 500 error (not moderation_blocked), attempt {attempt}/{max_retries}. Waiting {wait_time} seconds before retry...")
+                    wait_time = self._retry_wait(attempt, resp)
+                    print(f"Got {resp.status_code} error (not moderation_blocked), attempt {attempt}/{self.max_retries}. Waiting {wait_time:.1f} seconds before retry...")
                     time.sleep(wait_time)
                     continue
                 
-                else: # For any other error status code (not 2xx, not 500, and not moderation_blocked)
-                    # This 'else' now covers non-2xx, non-500 errors that weren't moderation blocks.
+                else: # For any other error status code (not 2xx, not retryable, and not moderation_blocked)
                     raise Exception(f"Image generation failed with status {resp.status_code}: {resp.text}")
                     
             except requests.exceptions.RequestException as e:
-                # Handle network-related errors
+                if method == "GET":
+                    retryable = isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.ReadTimeout))
+                else:
+                    retryable = never_sent(e)
+                if not retryable:
+                    raise Exception(f"Image request failed: {str(e)}")
                 attempt += 1
-                if attempt > max_retries:
-                    raise Exception(f"Max retries ({max_retries}) exceeded. Last error: {str(e)}")
+                if attempt > self.max_retries:
+                    raise Exception(f"Max retries ({self.max_retries}) exceeded. Last error: {str(e)}")
                 
-                wait_time = initial_wait * (2 ** (attempt - 1))
-                print(f"Network error, attempt {attempt}/{max_retries}. Waiting {wait_time} seconds before retry...")
+                wait_time = self._retry_wait(attempt)
+                print(f"Network error, attempt {attempt}/{self.max_retries}. Waiting {wait_time:.1f} seconds before retry...")
                 time.sleep(wait_time)
                 continue
         
-        raise Exception("Image generation failed after all retries")
\ No newline at end of file
+        raise Exception("Image generation failed after all retries")
@@ -1,4 +1,6 @@
 import settings
+import threading
+import time
 
 class DummyLEDs:
     """Dummy implementation when LEDs are disabled"""
@@ -8,14 +10,18 @@ class DummyLEDs:
     def error(self):
         pass
 
+    def generating(self):
+        pass
+
 class RealLEDs:
     """Real LED implementation using hardware"""
     def __init__(self):
         from gpiozero import LED
         import adafruit_dotstar as dotstar
         import board
-        import time
         
+        # percent() is called from the listening loop and generating() from the generation thread
+        self._lock = threading.Lock()
         self.power = LED(5)
         self.dots = dotstar.DotStar(board.SCK, board.MOSI, 12, brightness=0.2)
         self.power.on()
@@ -31,22 +37,28 @@ class RealLEDs:
             time.sleep(.1)
             
     def percent(self, p=0.5):
-        self.dots.fill((0,0,0))
-        time.sleep(.1)
-        cnt = 0
-        if p < 0:
+        with self._lock:
+            self.dots.fill((0,0,0))
+            time.sleep(.1)
             cnt = 0
-        elif p > 1:
-            cnt = 12
-        else:
-            cnt = int(round(12*p))
-        for i in range(0, cnt):
-            self.dots[i] = [255,0,0]
-            time.sleep(0.5)
+            if p < 0:
+                cnt = 0
+            elif p > 1:
+                cnt = 12
+            else:
+                cnt = int(round(12*p))
+            for i in range(0, cnt):
+                self.dots[i] = [255,0,0]
+                time.sleep(0.5)
             
     def error(self):
-        self.dots.fill((0,0,255))
-        time.sleep(1)
+        with self._lock:
+            self.dots.fill((0,0,255))
+            time.sleep(1)
+
+    def generating(self):
+        with self._lock:
+            self.dots.fill((0,255,0))
 
 # Create the appropriate LED implementation based on settings
 leds = RealLEDs() if settings.ENABLE_LEDS else DummyLEDs()
@@ -58,6 +70,9 @@ def percent(p=0.5):
 def error():
     leds.error()
 
+def generating():
+    leds.generating()
+
 if __name__ == '__main__':
     print("ready")
     time.sleep(2)
@@ -0,0 +1,118 @@
+################
+# Load test for the viewer: hammers /image and the static assets while holding WebSockets open
+#
+#   python3 serve.py                                  # in another terminal (or on the Pi)
+#   python3 loadtest.py --host localhost --port 5000 --concurrency 16 --duration 30 --websockets 8
+#
+# Reports requests per second and latency percentiles for each path, and how long the /ws
+# handshakes took.
+################
+
+import argparse
+import base64
+import http.client
+import os
+import socket
+import threading
+import time
+
+PATHS = ['/image?width=1280', '/static/script.js', '/static/style.css', '/']
+
+def percentile(timings, p):
+    return timings[min(int(len(timings) * p), len(timings) - 1)]
+
+def open_websocket(host, port, timeout=10):
+    """Do a raw WebSocket handshake on /ws, returns the connected socket"""
+    key = base64.b64encode(os.urandom(16)).decode()
+    conn = socket.create_connection((host, port), timeout=timeout)
+    conn.sendall((f"GET /ws HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                  f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode())
+    response = b""
+    while b"\r\n\r\n" not in response:
+        data = conn.recv(4096)
+        if not data:
+            raise ConnectionError("Connection closed during WebSocket handshake")
+        response += data
+    status = response.split(b"\r\n", 1)[0]
+    if b" 101 " not in status:
+        raise ConnectionError(f"WebSocket handshake failed: {status.decode(errors='replace')}")
+    return conn
+
+def worker(host, port, deadline, results, lock):
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    timings = {path: [] for path in PATHS}
+    errors = 0
+    i = 0
+    while time.monotonic() < deadline:
+        path = PATHS[i % len(PATHS)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request('GET', path, headers={'Accept-Encoding': 'gzip', 'Accept': 'image/webp,*/*'})
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors += 1
+                continue
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=10)
+            continue
+        timings[path].append(time.perf_counter() - start)
+    conn.close()
+    with lock:
+        for path, values in timings.items():
+            results['timings'][path].extend(values)
+        results['errors'] += errors
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=16, help='Connections making HTTP requests')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to run for')
+    parser.add_argument('--websockets', type=int, default=8, help='WebSockets held open for the run, like displays')
+    args = parser.parse_args()
+
+    handshakes = []
+    sockets = []
+    for _ in range(args.websockets):
+        start = time.perf_counter()
+        sockets.append(open_websocket(args.host, args.port))
+        handshakes.append(time.perf_counter() - start)
+
+    results = {'timings': {path: [] for path in PATHS}, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+    threads = [threading.Thread(target=worker, args=(args.host, args.port, deadline, results, lock))
+               for _ in range(args.concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    for conn in sockets:
+        conn.close()
+
+    print(f"{args.concurrency} connections for {elapsed:.1f}s with {args.websockets} WebSockets open, "
+          f"{results['errors']} errors")
+    total = 0
+    for path, timings in results['timings'].items():
+        if not timings:
+            print(f"{path:22s} no successful requests")
+            continue
+        timings.sort()
+        total += len(timings)
+        print(f"{path:22s} {len(timings) / elapsed:8.1f} req/s  p50 {1000 * percentile(timings, 0.5):8.2f}ms  "
+              f"p99 {1000 * percentile(timings, 0.99):8.2f}ms")
+    print(f"{'total':22s} {total / elapsed:8.1f} req/s")
+    if handshakes:
+        handshakes.sort()
+        print(f"{'/ws handshake':22s} {len(handshakes):8d} open   p50 {1000 * percentile(handshakes, 0.5):8.2f}ms  "
+              f"p99 {1000 * percentile(handshakes, 0.99):8.2f}ms")
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,16 @@
 import argparse
 from pvrecorder import PvRecorder
 import recording
+from capture import AudioCapture
+from transcription import TranscriptionPipeline
+from voice_detection import EnergyGate, VoiceDetector
+from transcript_store import TranscriptStore
+from image_db import ImageDB
+from generation import GenerationRunner
+from trigger import TopicTrigger, WINDOW_LINES
+from events import EventListener
 import generate
+import events
 import settings
 import webrtcvad
 import openai
@@ -16,47 +25,97 @@ SAMPLE_RATE = 16000
 FRAME_DURATION_MS = 30
 FRAME_LENGTH = int(SAMPLE_RATE * FRAME_DURATION_MS / 1000)  # 480 samples for 30ms at 16kHz
 
-def append_to_transcript(t):
-    with open(settings.TRANSCRIPT_FILE, "a") as f:
-        f.write(str(t) + "\n")
-    recording.trim_transcript_file(settings.TRANSCRIPT_FILE)
+def open_transcript():
+    return TranscriptStore(settings.TRANSCRIPT_DIR, settings.TRANSCRIPT_WINDOW_LINES,
+                           settings.TRANSCRIPT_HISTORY_LINES, legacy_file=settings.TRANSCRIPT_FILE)
 
 def run():
     openai.api_key = settings.OPENAI_API_KEY
 
     recorder = PvRecorder(frame_length=FRAME_LENGTH, device_index=settings.INPUT_DEVICE_ID)
-    vad = webrtcvad.Vad(3)  # Mode 0 (Quality) - least aggressive
+    vad = webrtcvad.Vad(settings.VAD_MODE)  # 0 (Quality, least aggressive) to 3 (most aggressive)
+    gate = None
+    if settings.ENERGY_GATE:
+        if EnergyGate.available():
+            gate = EnergyGate(settings.ENERGY_GATE_MARGIN)
+        else:
+            print("Warning: ENERGY_GATE needs audioop, which this Python doesn't have, running without it")
+    detector = VoiceDetector(vad, SAMPLE_RATE, settings.VAD_WINDOW_FRAMES, settings.VAD_BATCH_FRAMES,
+                             settings.PRE_ROLL_MS, gate)
+    # capture runs for the life of run(), listening and recording both read from it
+    capture = AudioCapture(recorder, SAMPLE_RATE)
+    transcript_store = open_transcript()
+    image_db = ImageDB(settings.IMAGE_DB_FILE, legacy_file=settings.DB_FILE)
+    # new images are made when the conversation moves on to something else
+    trigger = TopicTrigger(settings.TOPIC_DRIFT_THRESHOLD, settings.GENERATE_MIN_INTERVAL_SECONDS,
+                           settings.GENERATE_MAX_INTERVAL_SECONDS, settings.GENERATE_MIN_LINES)
+
+    def on_generation_finished(succeeded):
+        if not succeeded:
+            events.publish(events.ERROR, {"message": "Image generation failed"})
+        leds.percent(trigger.progress())
+
+    if settings.CUSTOM_AI_MODE == "callback":
+        # the image endpoint posts finished jobs to the viewer, which passes them on to us
+        job_listener = EventListener(settings.JOB_EVENT_SOCKET, lambda event: generate.job_update(event["data"]))
+        job_listener.start()
+
+    # images are made in the background so we keep listening while one is generated
+    generation = GenerationRunner(
+        lambda: generate.run(settings.OPENAI_API_KEY, WINDOW_LINES, image_db, transcript_store),
+        on_start=leds.generating,
+        on_finish=on_generation_finished
+    )
+
+    def on_transcript(transcript):
+        if transcript is not None and transcript != "" and transcript != "\n" and transcript.strip() != "":
+            print("* TS:")
+            print(transcript)
+            transcript_store.append(transcript)
+
+            if trigger.add(transcript):
+                generation.request()
+            else:
+                print(f"Topic drift {trigger.drift():.2f} of {settings.TOPIC_DRIFT_THRESHOLD}")
+
+    # transcription runs in the background so we go straight back to listening after each chunk
+    worker = recording.TranscriptionWorker(settings.TRANSCRIBER, settings.OPENAI_API_KEY, settings.TRANSCRIPTION_WORKERS)
+    pipeline = TranscriptionPipeline(
+        lambda pcm: recording.transcribe_chunk(pcm, worker),
+        on_transcript,
+        settings.MAX_PENDING_CHUNKS,
+        settings.TRANSCRIPTION_WORKERS
+    )
 
     try:
+        capture.start()
+        reader = capture.reader()
+
         # Generate an image on start up using the last stuff that was in the transcript
-        generate.run(settings.OPENAI_API_KEY, 20, settings.DB_FILE, settings.TRANSCRIPT_FILE)
+        trigger.seed(transcript_store.last_lines(WINDOW_LINES))
+        generation.start()
+        generation.request()
 
-        line_counter = 0
+        pipeline.start()
 
         while True:
-            leds.percent(line_counter/20.0)
-            recording.wait_for_voices(vad, recorder, SAMPLE_RATE)
-            # there should now be voices, so transcribe 15 seconds of audio
-            transcript = recording.transcribe_openai(recorder, 15, settings.OPENAI_API_KEY)
-
-            if transcript is not None and transcript != "" and transcript != "\n" and transcript.strip() != "":
-                print("* TS:")
-                print(transcript)
-                append_to_transcript(transcript)
-
-                # each time we get a transcript line, we increase the counter by one.
-                # then each time we get 20 new lines, we call generate
-                line_counter+=1
-                if line_counter >= 20:
-                    line_counter = 0
-                    generate.run(settings.OPENAI_API_KEY, 20, settings.DB_FILE, settings.TRANSCRIPT_FILE)
-                else:
-                    print("Need " +str(20-line_counter)+" More snippets")
+            if not generation.busy():
+                leds.percent(trigger.progress())
+                events.publish(events.LISTENING)
+            preroll = detector.wait(reader)
+            # there should now be voices, so record up to 15 seconds of audio, starting with the pre-roll
+            pcm = recording.record_chunk(reader, settings.MAX_CHUNK_SECONDS, preroll,
+                                         detector if settings.ENDPOINTING else None)
+            pipeline.submit(pcm)
 
     except KeyboardInterrupt as e:
         print("stopping")
         raise e
     finally:
+        pipeline.stop()
+        generation.stop(timeout=5)
+        worker.close()
+        capture.stop()
         if recorder is not None:
             recorder.delete()
 
@@ -75,7 +134,7 @@ def main():
         print("running...")
         # run flask in another python process
         time.sleep(5)
-        browser_process = subprocess.Popen(['python3', 'view.py'])
+        browser_process = subprocess.Popen(['python3', 'serve.py'])
 
         def signal_handler(sig, frame):
             print('Stopping Flask app and closing browser')
@@ -93,6 +152,7 @@ def main():
             except Exception as e:
                 print("Exception: ", e)
                 print("Restart Required...")
+                events.publish(events.ERROR, {"message": str(e)})
                 leds.error()
                 while True:
                     time.sleep(30)
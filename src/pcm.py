@@ -0,0 +1,49 @@
+import struct
+from array import array
+
+_frame_structs = {}
+
+def frame_struct(length):
+    """A compiled int16 Struct for frames of length samples. Packing PvRecorder's list through it
+    is about 3x faster than array('h', list)"""
+    compiled = _frame_structs.get(length)
+    if compiled is None:
+        compiled = _frame_structs[length] = struct.Struct('%dh' % length)
+    return compiled
+
+def as_frame(pcm):
+    """Return a frame of samples as an int16 array"""
+    if isinstance(pcm, array):
+        return pcm
+    return array('h', frame_struct(len(pcm)).pack(*pcm))
+
+def frame_bytes(pcm):
+    """Raw PCM bytes of a frame, as webrtcvad and the WAV encoder expect them"""
+    if isinstance(pcm, array):
+        return pcm.tobytes()
+    return frame_struct(len(pcm)).pack(*pcm)
+
+def pack_frame(pcm, samples, offset):
+    """Copy a frame into the int16 array samples, starting at sample offset"""
+    if isinstance(pcm, array):
+        samples[offset:offset + len(pcm)] = pcm
+    else:
+        frame_struct(len(pcm)).pack_into(samples, offset * 2, *pcm)
+
+class PcmBuffer:
+    """A preallocated int16 buffer that frames are copied into as a chunk is recorded"""
+
+    def __init__(self, max_samples):
+        self._samples = array('h', bytes(2 * max_samples))
+        self.length = 0
+
+    def append(self, pcm):
+        end = self.length + len(pcm)
+        if end > len(self._samples):
+            raise ValueError("PcmBuffer is full")
+        pack_frame(pcm, self._samples, self.length)
+        self.length = end
+
+    def view(self):
+        """The recorded PCM as bytes, without copying"""
+        return memoryview(self._samples).cast('B')[:self.length * 2]
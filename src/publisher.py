@@ -0,0 +1,71 @@
+import json
+import threading
+import time
+
+MIN_PUBLISH_INTERVAL = 10  # Seconds between publishes, Adafruit IO's free tier allows 30 a minute
+INITIAL_RETRY_WAIT = 5
+MAX_RETRY_WAIT = 300
+
+class AdafruitPublisher:
+    """Publishes the current image to an Adafruit IO feed from a background thread.
+
+    publish() only records the latest value and returns immediately, so it is safe to call on
+    every request. Only the newest value is sent, and only if it differs from what was last
+    published, so if several arrive before the thread gets to them only the last one counts. Failed publishes are retried with
+    exponential backoff.
+    """
+
+    def __init__(self, client, feed, min_interval=MIN_PUBLISH_INTERVAL):
+        self.client = client
+        self.feed = feed
+        self.min_interval = min_interval
+        self.published = 0
+        self.skipped = 0
+        self._condition = threading.Condition()
+        self._latest = None  # newest value passed to publish()
+        self._last_published = None
+        self._last_publish_time = 0
+        self._thread = threading.Thread(target=self._run, name="adafruit-publisher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def publish(self, data):
+        payload = json.dumps(data)
+        with self._condition:
+            # a value equal to _last_published still replaces a different pending one
+            if payload == self._latest:
+                self.skipped += 1
+                return
+            self._latest = payload
+            self._condition.notify()
+
+    def _run(self):
+        retry_wait = INITIAL_RETRY_WAIT
+        while True:
+            with self._condition:
+                while self._latest is None or self._latest == self._last_published:
+                    self._condition.wait()
+
+            # rate limit, anything published while we wait replaces the pending value
+            wait = self._last_publish_time + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+            with self._condition:
+                payload = self._latest
+                if payload == self._last_published:
+                    continue  # changed back while we waited
+            try:
+                self.client.append(self.feed, payload)
+            except Exception as e:
+                print(f"Warning: Failed to publish to Adafruit IO, retrying in {retry_wait}s: {e}")
+                time.sleep(retry_wait)
+                retry_wait = min(retry_wait * 2, MAX_RETRY_WAIT)
+                continue
+
+            retry_wait = INITIAL_RETRY_WAIT
+            self._last_publish_time = time.monotonic()
+            self.published += 1
+            with self._condition:
+                self._last_published = payload
@@ -1,98 +1,132 @@
 import sys
-import collections
+import io
 import wave
 import multiprocessing
-import time
-import struct
-import openai
+import threading
 import os
-import webrtcvad
-
-TEMP_WAVE_FILE = "output.wav"
-RUNNING_SUM_COUNT = 5  # Looking at 5 frames (150ms at 30ms per frame)
-MAX_TRANSCRIPT_LINES = 120  # About 1 hour of transcript (15s recordings every ~30s)
-
-def _openai_background(openai_api_key):
-    print("** Open AI Says...")
-    import openai
-    client = openai.OpenAI(api_key=openai_api_key)
-    with open(TEMP_WAVE_FILE, 'rb') as af:
-        transcript = client.audio.transcriptions.create(
-            model="gpt-4o-transcribe", 
-            file=af, 
-            response_format="text",
-            prompt="The following is some audio that needs transcription. If you don't know what is being said or if the audio is blank return nothing (an empty result)."
-        )
-        print(transcript)
-        return str(transcript)
-
-mpPool = multiprocessing.Pool(1)
-
-def wait_for_voices(vad, recorder, sample_rate):
-    print("Listening...")
-    running_values = collections.deque([0] * RUNNING_SUM_COUNT, maxlen=RUNNING_SUM_COUNT)
+import settings
+from datetime import datetime
+from pcm import PcmBuffer
+from transcribers import create_transcriber
+
+REQUEST_TIMEOUT = 20  # Seconds the API gets to transcribe a chunk before the request is cancelled
+STUCK_WORKER_GRACE = 10  # Extra seconds before a worker that ignored its timeout is killed
+
+# one transcriber per worker process, created once so its client connections (or model) are
+# reused for every chunk
+_transcriber = None
+
+def _init_worker(backend, openai_api_key, timeout):
+    global _transcriber
+    _transcriber = create_transcriber(backend, openai_api_key, timeout)
+
+def _transcribe_background(wav_data):
+    print("** Transcriber Says...")
     try:
-        recorder.start()
-
-        while True:
-            pcm = recorder.read()
-            audio_frame = struct.pack("%dh" % len(pcm), *pcm)
-            is_speech = vad.is_speech(audio_frame, sample_rate)
-            
-            running_values.append(1 if is_speech else 0)
-            active_frames = sum(running_values)
-            
-            # Debug output on one line
-            # sys.stdout.write("\rFrame: speech=%s values=%s active=%d/%d thresh=%d     " % (
-            #     is_speech,
-            #     list(running_values),
-            #     active_frames,
-            #     RUNNING_SUM_COUNT,
-            #     RUNNING_SUM_COUNT  # Now requiring all frames to be speech
-            # ))
-            # sys.stdout.flush()
-            
-            if active_frames == RUNNING_SUM_COUNT:  # All frames must be speech
-                print("\nVoice detected! Starting recording...")
-                break
-            
-            # Add a small delay to make the output more readable
-            time.sleep(0.1)
-    except KeyboardInterrupt:
-        raise
-    finally:
-        recorder.stop()
-
-def trim_transcript_file(transcript_file):
-    """Keep only the last MAX_TRANSCRIPT_LINES lines in the transcript file"""
-    if not os.path.exists(transcript_file):
-        return
-        
-    with open(transcript_file, 'r') as f:
-        lines = f.readlines()
-    
-    if len(lines) > MAX_TRANSCRIPT_LINES:
-        with open(transcript_file, 'w') as f:
-            f.writelines(lines[-MAX_TRANSCRIPT_LINES:])
-
-def transcribe_openai(recorder, timeout, openai_api_key):
-    global mpPool
+        transcript = _transcriber.transcribe(wav_data)
+    except Exception as e:
+        # some openai exceptions take keyword-only arguments and can't be unpickled in the parent,
+        # which kills the pool's result handler, so only pass back what went wrong
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+    print(transcript)
+    return transcript
+
+class TranscriptionWorker:
+    """Long-lived worker processes that transcribe chunks with one reused transcriber each.
+
+    backend is a name understood by transcribers.create_transcriber. Requests that run past the
+    timeout are cancelled by the OpenAI client. If a worker is still stuck after that, the pool is
+    terminated and replaced rather than left running in the background.
+    """
+
+    def __init__(self, backend, openai_api_key, processes=1, timeout=REQUEST_TIMEOUT):
+        self.backend = backend
+        self.openai_api_key = openai_api_key
+        self.processes = processes
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pool = self._new_pool()
+
+    def _new_pool(self):
+        return multiprocessing.Pool(self.processes, initializer=_init_worker,
+                                    initargs=(self.backend, self.openai_api_key, self.timeout))
+
+    def transcribe(self, wav_data):
+        pool = self._pool
+        res = pool.apply_async(_transcribe_background, [wav_data])
+        try:
+            return res.get(self.timeout + STUCK_WORKER_GRACE)
+        except multiprocessing.TimeoutError:
+            print("Transcription worker is stuck, restarting it")
+            self._restart(pool)
+            return ""
+        except Exception as e:
+            print("Transcription failed: ", e)
+            return ""
+
+    def _restart(self, pool):
+        with self._lock:
+            # another thread may have already replaced this pool
+            if self._pool is pool:
+                try:
+                    pool.terminate()
+                    pool.join()
+                finally:
+                    self._pool = self._new_pool()
+
+    def close(self):
+        with self._lock:
+            self._pool.terminate()
+            self._pool.join()
+
+def record_chunk(reader, timeout, preroll=(), detector=None):
+    """Record up to timeout seconds of audio and return it as raw PCM, starting with the pre-roll.
+
+    When a VoiceDetector is given the chunk is closed early once there has been ENDPOINT_SILENCE_MS of
+    trailing silence, but never before MIN_CHUNK_SECONDS.
+    """
     print("recording")
-    wav_file = wave.open(TEMP_WAVE_FILE, "w")
-    wav_file.setparams((1, 2, 16000, 512, "NONE", "NONE"))
-    recorder.start()
-    start_time = time.time() # get current time
+    # count frames rather than wall-clock time, the reader may be catching up on buffered audio
+    frame_count = int(timeout * 16000 / reader.frame_length)
+    chunk = PcmBuffer((len(preroll) + frame_count) * reader.frame_length)
+    for pcm in preroll:
+        chunk.append(pcm)
+
+    min_frame_count = int(settings.MIN_CHUNK_SECONDS * 16000 / reader.frame_length)
+    endpoint_frames = int(settings.ENDPOINT_SILENCE_MS * 16000 / 1000 / reader.frame_length)
+    silent_frames = 0
+    for i in range(frame_count):
+        pcm = reader.read()
+        chunk.append(pcm)
+
+        if detector is not None:
+            silent_frames = 0 if detector.is_speech(pcm) else silent_frames + 1
+            if silent_frames >= endpoint_frames and i + 1 >= min_frame_count:
+                print("End of speech after %.1f seconds" % ((i + 1) * reader.frame_length / 16000))
+                break
 
-    while time.time() - start_time < timeout: # run loop for 15 seconds
-        pcm = recorder.read()
-        wav_file.writeframes(struct.pack("h" * len(pcm), *pcm))
+    return chunk.view()
 
-    recorder.stop()
+def encode_wav(pcm):
+    """Wrap raw 16kHz mono PCM in a WAV header, in memory"""
+    buffer = io.BytesIO()
+    wav_file = wave.open(buffer, "wb")
+    wav_file.setparams((1, 2, 16000, 512, "NONE", "NONE"))
+    wav_file.writeframes(pcm)
     wav_file.close()
-    res = mpPool.apply_async(_openai_background, [openai_api_key])
-    try:
-        transcript = res.get(20)
-        return transcript
-    except:
-        mpPool = multiprocessing.Pool(1)
-        return ""
+    return buffer.getvalue()
+
+def spool_wav(wav_data, spool_dir):
+    """Keep a copy of a chunk on disk for debugging"""
+    os.makedirs(spool_dir, exist_ok=True)
+    file_name = os.path.join(spool_dir, "chunk-%s.wav" % datetime.now().strftime("%Y%m%d-%H%M%S-%f"))
+    with open(file_name, "wb") as f:
+        f.write(wav_data)
+
+def transcribe_chunk(pcm, worker):
+    """Transcribe a chunk of raw PCM from record_chunk with a TranscriptionWorker"""
+    wav_data = encode_wav(pcm)
+    if settings.AUDIO_SPOOL_DIR:
+        spool_wav(wav_data, settings.AUDIO_SPOOL_DIR)
+
+    return worker.transcribe(wav_data)
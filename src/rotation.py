@@ -0,0 +1,140 @@
+import datetime
+import random
+import threading
+
+RECENT_BOOST = 3.0  # A brand new image is this much more likely than an old one to come up early in a pass
+RECENT_HALF_LIFE_DAYS = 7  # ...halving every week
+FAVORITE_WEIGHT = 4.0
+
+class RotationScheduler:
+    """Decides which image the displays show, the same one for every display until the next rotation.
+
+    Each pass through the images is a weighted shuffle made with the scheduler's own Random: every
+    image is shown once before any repeats, but recent and favorite images tend to come up early in
+    the pass. A background thread moves to the next image every interval seconds, so current() is a
+    list lookup. Images added during a pass are slotted into the rest of it. A new image is held on
+    screen for latest_hold after it is made, and nothing is shown during quiet hours.
+    """
+
+    def __init__(self, image_index, interval, latest_hold, quiet_start, quiet_end,
+                 favorites=None, on_advance=None, rng=None):
+        self.image_index = image_index
+        self.interval = interval
+        self.latest_hold = latest_hold
+        self.quiet_start = quiet_start
+        self.quiet_end = quiet_end
+        self.favorites = favorites or set  # returns the urls of favorite images
+        self.on_advance = on_advance  # called with the image that will be shown next, e.g. to prefetch it
+        self.rng = rng or random.Random()
+        self._condition = threading.Condition()
+        self._playlist = []  # indexes into image_index.records()
+        self._position = 0
+        self._known = 0  # records the playlist was made from
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="rotation", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def is_quiet(self, time):
+        """quiet_start (inclusive) to quiet_end (exclusive), wrapping past midnight. Equal times mean never"""
+        if self.quiet_start <= self.quiet_end:
+            return self.quiet_start <= time < self.quiet_end
+        return time >= self.quiet_start or time < self.quiet_end
+
+    def current(self, now=None):
+        """The image to show now, or {} for nothing"""
+        now = now or datetime.datetime.now()
+        latest = self.image_index.latest()
+        if latest is None:
+            return {}
+        try:
+            recent = now - datetime.datetime.fromisoformat(latest['date']) <= self.latest_hold
+        except (TypeError, ValueError):
+            recent = False  # no date, e.g. a record migrated from the old database
+        if recent:
+            return latest
+        if self.is_quiet(now.time()):
+            return {}
+        with self._condition:
+            records = self._sync()
+            return records[self._playlist[self._position]]
+
+    def upcoming(self):
+        """The image the next rotation will show"""
+        with self._condition:
+            records = self._sync()
+            if not records:
+                return None
+            if self._position + 1 < len(self._playlist):
+                return records[self._playlist[self._position + 1]]
+            return None  # the next pass hasn't been shuffled yet
+
+    def reshuffle(self):
+        """Start a new pass, e.g. after favorites change"""
+        with self._condition:
+            self._playlist = []
+
+    def _weight(self, record, now, favorites):
+        try:
+            age_days = (now - datetime.datetime.fromisoformat(record['date'])).total_seconds() / 86400
+        except (TypeError, ValueError):
+            age_days = float('inf')
+        weight = 1 + RECENT_BOOST * 0.5 ** (max(age_days, 0) / RECENT_HALF_LIFE_DAYS)
+        if record['url'] in favorites:
+            weight *= FAVORITE_WEIGHT
+        return weight
+
+    def _shuffle(self, records, last=None):
+        """A new pass: a weighted random order (heavier images tend to come first) of every record.
+        last is the image shown before the pass, which won't also be shown first
+        """
+        now = datetime.datetime.now()
+        favorites = self.favorites()
+        keys = [self.rng.random() ** (1 / self._weight(record, now, favorites)) for record in records]
+        playlist = sorted(range(len(records)), key=keys.__getitem__, reverse=True)
+        if len(playlist) > 1 and playlist[0] == last:
+            playlist[0], playlist[1] = playlist[1], playlist[0]
+        self._playlist = playlist
+        self._position = 0
+
+    def _sync(self):
+        """Bring the playlist up to date with the index, call with the condition held"""
+        records = self.image_index.records()
+        if len(records) < self._known or not self._playlist:
+            # the database was replaced (or this is the first pass)
+            self._shuffle(records)
+        elif len(records) > self._known:
+            # slot new images somewhere in the rest of this pass
+            for i in range(self._known, len(records)):
+                self._playlist.insert(self.rng.randint(self._position + 1, len(self._playlist)), i)
+        self._known = len(records)
+        return records
+
+    def _advance(self):
+        with self._condition:
+            records = self._sync()
+            if not records:
+                return
+            self._position += 1
+            if self._position >= len(self._playlist):
+                self._shuffle(records, last=self._playlist[-1])
+        upcoming = self.upcoming()
+        if upcoming is not None and self.on_advance is not None:
+            self.on_advance(upcoming)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait(self.interval)
+                if self._stopped:
+                    return
+            try:
+                self._advance()
+            except Exception as e:
+                print(f"Warning: Failed to rotate image: {e}")
@@ -0,0 +1,78 @@
+################
+# Runs the viewer (view.py) for the displays
+#
+#   python3 serve.py
+#
+# By default it's served by gunicorn with one worker process and VIEW_THREADS threads. Set
+# VIEW_DEBUG=true for Flask's debug server instead.
+################
+
+import signal
+import subprocess
+import sys
+from gunicorn.app.base import BaseApplication
+import settings
+
+browser_process = None
+
+def start_browser():
+    global browser_process
+    if settings.START_BROWSER:
+        # Start the browser in kiosk mode
+        browser_process = subprocess.Popen(['chromium', '-kiosk', f'http://localhost:{settings.VIEW_PORT}'])
+
+def stop_browser():
+    if browser_process is not None:
+        print('Closing browser')
+        browser_process.terminate()
+
+class ViewerApplication(BaseApplication):
+    """gunicorn serving view.app from one worker process with a pool of threads.
+
+    There is only one worker because the viewer keeps its state in memory: the connected displays,
+    the rotation and the event socket it listens on. view is imported in the worker rather than
+    here so its background threads run in the process that serves requests.
+    """
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        import view
+        return view.app
+
+def run_debug():
+    import view
+
+    def signal_handler(sig, frame):
+        print('Stopping Flask app')
+        stop_browser()
+        sys.exit(0)
+
+    start_browser()
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+    # no reloader, it would run a second copy of the viewer's threads and event socket
+    view.app.run(host=settings.VIEW_HOST, port=settings.VIEW_PORT, debug=True, use_reloader=False)
+
+def main():
+    if settings.VIEW_DEBUG:
+        run_debug()
+        return
+
+    ViewerApplication({
+        'bind': f'{settings.VIEW_HOST}:{settings.VIEW_PORT}',
+        'workers': 1,
+        'worker_class': 'gthread',
+        'threads': settings.VIEW_THREADS,
+        'when_ready': lambda server: start_browser(),
+        'on_exit': lambda server: stop_browser(),
+    }).run()
+
+if __name__ == '__main__':
+    main()
@@ -7,18 +7,72 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 CUSTOM_AI_ENDPOINT = os.getenv('CUSTOM_AI_ENDPOINT', 'http://localhost:7071')
 CUSTOM_AI_CODE = os.getenv('CUSTOM_AI_CODE')  # Authentication code for custom AI endpoint
+CUSTOM_AI_CONNECT_TIMEOUT = float(os.getenv('CUSTOM_AI_CONNECT_TIMEOUT', '10'))  # Seconds to connect to the endpoint
+CUSTOM_AI_READ_TIMEOUT = float(os.getenv('CUSTOM_AI_READ_TIMEOUT', '300'))  # Seconds to wait for an image
+CUSTOM_AI_MODE = os.getenv('CUSTOM_AI_MODE', 'sync')  # sync (one long request), poll or callback
+CUSTOM_AI_CALLBACK_URL = os.getenv('CUSTOM_AI_CALLBACK_URL')  # The viewer's address as the endpoint can reach it, for callback mode
 ADAFRUIT_IO_USERNAME = os.getenv('ADAFRUIT_IO_USERNAME')
 ADAFRUIT_IO_KEY = os.getenv('ADAFRUIT_IO_KEY')
 ADAFRUIT_IO_FEED = os.getenv('ADAFRUIT_IO_FEED', 'whisperframe')
+ADAFRUIT_IO_BASE_URL = os.getenv('ADAFRUIT_IO_BASE_URL', 'https://io.adafruit.com')  # Point at a local stand-in for testing
+ADAFRUIT_IO_MIN_INTERVAL = float(os.getenv('ADAFRUIT_IO_MIN_INTERVAL', '10'))  # Seconds between publishes
 PV_ACCESS_KEY = os.getenv('PV_ACCESS_KEY')
 
 # Hardware configuration
 INPUT_DEVICE_ID = int(os.getenv('INPUT_DEVICE_ID', '0'))
 ENABLE_LEDS = os.getenv('ENABLE_LEDS', 'false').lower() == 'true'
 
+# Audio settings
+VAD_MODE = int(os.getenv('VAD_MODE', '3'))  # webrtcvad aggressiveness, 0-3
+VAD_WINDOW_FRAMES = int(os.getenv('VAD_WINDOW_FRAMES', '5'))  # Consecutive 30ms speech frames that count as voices
+VAD_BATCH_FRAMES = int(os.getenv('VAD_BATCH_FRAMES', '1'))  # Frames processed per wakeup while listening
+ENERGY_GATE = os.getenv('ENERGY_GATE', 'false').lower() == 'true'  # Skip the VAD on frames near the noise floor
+ENERGY_GATE_MARGIN = float(os.getenv('ENERGY_GATE_MARGIN', '1.5'))  # Multiple of the noise floor a frame must exceed
+PRE_ROLL_MS = int(os.getenv('PRE_ROLL_MS', '1000'))  # Audio kept from before voice detection
+ENDPOINTING = os.getenv('ENDPOINTING', 'true').lower() == 'true'  # Close chunks when speech stops
+ENDPOINT_SILENCE_MS = int(os.getenv('ENDPOINT_SILENCE_MS', '1200'))  # Trailing silence that ends a chunk
+MIN_CHUNK_SECONDS = float(os.getenv('MIN_CHUNK_SECONDS', '3'))
+MAX_CHUNK_SECONDS = float(os.getenv('MAX_CHUNK_SECONDS', '15'))
+MAX_PENDING_CHUNKS = int(os.getenv('MAX_PENDING_CHUNKS', '4'))  # Recorded chunks waiting on transcription
+TRANSCRIPTION_WORKERS = int(os.getenv('TRANSCRIPTION_WORKERS', '2'))  # Chunks uploaded at the same time
+AUDIO_SPOOL_DIR = os.getenv('AUDIO_SPOOL_DIR', '')  # Save each chunk here as a WAV, for debugging
+
+# Transcription settings
+TRANSCRIBER = os.getenv('TRANSCRIBER', 'openai')  # openai, local (faster-whisper) or stub
+LOCAL_WHISPER_MODEL = os.getenv('LOCAL_WHISPER_MODEL', 'tiny.en')
+LOCAL_WHISPER_THREADS = int(os.getenv('LOCAL_WHISPER_THREADS', '4'))
+STUB_TRANSCRIPT = os.getenv('STUB_TRANSCRIPT', '')  # Text the stub transcriber returns for every chunk
+TRANSCRIPT_WINDOW_LINES = int(os.getenv('TRANSCRIPT_WINDOW_LINES', '120'))  # Lines kept in memory, about 1 hour
+TRANSCRIPT_HISTORY_LINES = int(os.getenv('TRANSCRIPT_HISTORY_LINES', '5760'))  # Lines kept on disk, about 2 days
+
+# Generation settings
+TOPIC_DRIFT_THRESHOLD = float(os.getenv('TOPIC_DRIFT_THRESHOLD', '0.6'))  # 0 (any change) to 1 (nothing in common)
+GENERATE_MIN_INTERVAL_SECONDS = int(os.getenv('GENERATE_MIN_INTERVAL_SECONDS', '180'))  # However fast the topic changes
+GENERATE_MAX_INTERVAL_SECONDS = int(os.getenv('GENERATE_MAX_INTERVAL_SECONDS', '1800'))  # Even if the topic hasn't changed
+GENERATE_MIN_LINES = int(os.getenv('GENERATE_MIN_LINES', '5'))  # New transcript lines needed before a new image
+
+# Display settings
+IMAGE_CACHE_MAX_MB = int(os.getenv('IMAGE_CACHE_MAX_MB', '500'))  # Least recently shown images are deleted past this
+ROTATION_INTERVAL_SECONDS = int(os.getenv('ROTATION_INTERVAL_SECONDS', '360'))  # How long each image is shown
+LATEST_IMAGE_HOLD_MINUTES = int(os.getenv('LATEST_IMAGE_HOLD_MINUTES', '30'))  # A new image stays up this long
+QUIET_HOURS_START = os.getenv('QUIET_HOURS_START', '00:00')  # Displays go dark from here...
+QUIET_HOURS_END = os.getenv('QUIET_HOURS_END', '07:00')  # ...until here, the same time for both turns this off
+
 # Browser settings
 START_BROWSER = os.getenv('START_BROWSER', 'false').lower() == 'true'
 
+# Viewer server settings
+VIEW_HOST = os.getenv('VIEW_HOST', '0.0.0.0')
+VIEW_PORT = int(os.getenv('VIEW_PORT', '5000'))
+VIEW_THREADS = int(os.getenv('VIEW_THREADS', '32'))  # Requests served at once, each connected display holds one
+VIEW_DEBUG = os.getenv('VIEW_DEBUG', 'false').lower() == 'true'  # Flask's debug server instead of gunicorn
+STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', '3600'))  # Seconds browsers can cache the page's scripts and styles
+
 # File paths
-TRANSCRIPT_FILE = "db/transcript.txt"
-DB_FILE = "db/prompts.json"
\ No newline at end of file
+TRANSCRIPT_DIR = "db/transcript"
+TRANSCRIPT_FILE = "db/transcript.txt"  # Old single-file transcript, migrated into TRANSCRIPT_DIR on first run
+EVENT_SOCKET = "db/events.sock"  # Unix socket the generator sends pipeline events to the viewer on
+JOB_EVENT_SOCKET = "db/jobs.sock"  # Image job callbacks, passed from the viewer to main.py
+IMAGE_DB_FILE = "db/images.sqlite3"
+IMAGE_CACHE_DIR = "db/image_cache"  # Local copies of images for the displays
+DB_FILE = "db/prompts.json"  # Old JSON image list, migrated into IMAGE_DB_FILE on first run
\ No newline at end of file
@@ -29,6 +29,22 @@ function showImageInfo(data) {
     }, 20000);
 }
 
+function showStatus(event, data) {
+    const status = document.getElementById('status');
+    if (event === 'error') {
+        status.textContent = 'error: ' + (data.message || '');
+    } else {
+        status.textContent = event;
+    }
+    status.className = event;
+}
+
+// Pixels across the background image is drawn at, it covers the window and is 3:2
+function displayWidth() {
+    const cssWidth = Math.max(window.innerWidth, window.innerHeight * 1.5);
+    return Math.round(cssWidth * (window.devicePixelRatio || 1));
+}
+
 function fetchImage() {
     const now = Date.now();
     if (now - lastFetchTime < FETCH_INTERVAL) {
@@ -36,7 +52,7 @@ function fetchImage() {
     }
     lastFetchTime = now;
     
-    fetch('/image')
+    fetch(`/image?width=${displayWidth()}`)
         .then(response => response.json())
         .then(showImageInfo)
         .catch(console.error);
@@ -48,9 +64,17 @@ function connectWebSocket() {
     
     socket = new WebSocket(wsUrl);
     
-    socket.onmessage = (event) => {
-        const data = JSON.parse(event.data);
-        showImageInfo(data);
+    socket.onmessage = (message) => {
+        const event = JSON.parse(message.data);
+        if (event.event === 'heartbeat') {
+            return;
+        }
+        if (event.event === 'new_image') {
+            showImageInfo(event.data);
+            showStatus('listening', {});
+        } else {
+            showStatus(event.event, event.data);
+        }
     };
     
     socket.onclose = () => {
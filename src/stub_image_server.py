@@ -0,0 +1,202 @@
+################
+# A local stand-in for the custom AI image endpoint (see custom_ai_image_generator.md), for
+# trying out image generation without spending API credit
+#
+#   python3 stub_image_server.py --port 7071 --delay 2
+#   CUSTOM_AI_ENDPOINT=http://localhost:7071 CUSTOM_AI_CODE=test python3 main.py
+#
+# It can also misbehave, to see how the generator copes:
+#   --fail-rate 0.5 --fail-status 503 --retry-after 5   half the requests fail, asking for a retry in 5s
+#   --hang                                              never answer (the read timeout should fire)
+#   --block-word cat                                    reject prompts containing "cat" as moderation_blocked
+#
+# It serves both the one-request protocol (POST /api/GenerateImage) and the job protocol
+# (POST /api/jobs, GET /api/jobs/<id>, optional callbackUrl) used by CUSTOM_AI_MODE=poll/callback.
+################
+
+import argparse
+import json
+import random
+import struct
+import threading
+import time
+import urllib.request
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+POLL_INTERVAL = 2  # Retry-After sent with job statuses that aren't finished
+
+def make_png(width, height, color):
+    """A solid color PNG, so the stub needs nothing beyond the standard library"""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    row = b"\x00" + bytes(color) * width
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(row * height))
+            + chunk(b"IEND", b""))
+
+class StubImageHandler(BaseHTTPRequestHandler):
+    server_version = "StubImageServer/1.0"
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoint
+
+    def log_message(self, format, *args):
+        print(f"{self.address_string()} {format % args}")
+
+    def send_json(self, status, data, headers=None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return None
+
+    def check(self, data):
+        """An error response (status, body, headers) if this request should fail, otherwise None"""
+        options = self.server.options
+        if data is None or not data.get("group"):
+            return 400, {"error": {"code": "bad_request", "message": "Invalid JSON or group"}}, {}
+        if random.random() < options.fail_rate:
+            headers = {"Retry-After": str(options.retry_after)} if options.retry_after is not None else {}
+            return options.fail_status, {"error": {"code": "server_error", "message": "Stub failure"}}, headers
+        return None
+
+    def blocked(self, data):
+        options = self.server.options
+        return options.block_word and options.block_word in data.get("details", "")
+
+    def make_image(self, data):
+        """Wait as long as a generation takes, then store an image. Returns its id and path"""
+        if self.server.options.hang:
+            threading.Event().wait()
+        time.sleep(self.server.options.delay)
+        request_id = str(uuid.uuid4())
+        with self.server.lock:
+            self.server.images[request_id] = make_png(96, 64, [random.randrange(256) for _ in range(3)])
+        return request_id, f"api/image/{data['group']}/{request_id}"
+
+    def generate(self, data):
+        """Make an image for a request body, returns (status, response body, headers)"""
+        error = self.check(data)
+        if error is not None:
+            return error
+        if self.blocked(data):
+            return 400, {"error": {"code": "moderation_blocked", "message": "Your request was rejected by the safety system"}}, {}
+        request_id, image_url = self.make_image(data)
+        return 200, {
+            "requestId": request_id,
+            "status": "Complete",
+            "message": "Image generation request complete",
+            "imageUrl": image_url,
+            "prompt": data.get("details", "")
+        }, {}
+
+    def submit_job(self, data):
+        """Start a job in the background, returns (status, response body, headers) straight away"""
+        error = self.check(data)
+        if error is not None:
+            return error
+        job_id = str(uuid.uuid4())
+        job = {"jobId": job_id, "status": "Running"}
+        with self.server.lock:
+            self.server.jobs[job_id] = job
+        threading.Thread(target=self.run_job, args=(job_id, data), daemon=True).start()
+        return 202, job, {"Retry-After": str(POLL_INTERVAL)}
+
+    def run_job(self, job_id, data):
+        if self.blocked(data):
+            time.sleep(self.server.options.delay)
+            job = {"jobId": job_id, "status": "Failed",
+                   "error": {"code": "moderation_blocked", "message": "Your request was rejected by the safety system"}}
+        else:
+            _, image_url = self.make_image(data)
+            job = {"jobId": job_id, "status": "Complete", "imageUrl": image_url, "prompt": data.get("details", "")}
+        with self.server.lock:
+            self.server.jobs[job_id] = job
+
+        if data.get("callbackUrl"):
+            request = urllib.request.Request(data["callbackUrl"], data=json.dumps(job).encode("utf-8"),
+                                             headers={"Content-Type": "application/json"}, method="POST")
+            try:
+                urllib.request.urlopen(request, timeout=10).close()
+            except OSError as e:
+                print(f"Callback for job {job_id} failed: {e}")
+
+    def job_status(self, job_id):
+        with self.server.lock:
+            job = self.server.jobs.get(job_id)
+        if job is None:
+            return 404, {"error": {"code": "not_found", "message": f"No job {job_id}"}}, {}
+        headers = {"Retry-After": str(POLL_INTERVAL)} if job["status"] == "Running" else {}
+        return 200, job, headers
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        data = self.read_json()
+        if path in ("/api/GenerateImage", "/api/generate"):
+            status, body, headers = self.generate(data)
+        elif path == "/api/jobs":
+            status, body, headers = self.submit_job(data)
+        else:
+            status, body, headers = 404, {"error": {"code": "not_found", "message": path}}, {}
+        self.send_json(status, body, headers)
+
+    def do_GET(self):
+        parts = urlparse(self.path).path.strip("/").split("/")
+        if len(parts) == 3 and parts[:2] == ["api", "jobs"]:
+            self.send_json(*self.job_status(parts[2]))
+            return
+        if len(parts) == 4 and parts[:2] == ["api", "image"]:
+            with self.server.lock:
+                image = self.server.images.get(parts[3])
+            if image is not None:
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(image)))
+                self.end_headers()
+                self.wfile.write(image)
+                return
+        self.send_json(404, {"error": {"code": "not_found", "message": self.path}})
+
+class StubImageServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, options):
+        super().__init__(address, StubImageHandler)
+        self.options = options
+        self.images = {}
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=7071)
+    parser.add_argument('--delay', type=float, default=1, help='Seconds each generation takes')
+    parser.add_argument('--fail-rate', type=float, default=0, help='Fraction of generations that fail')
+    parser.add_argument('--fail-status', type=int, default=500, help='Status code failed generations return')
+    parser.add_argument('--retry-after', type=int, default=None, help='Retry-After seconds sent with failures')
+    parser.add_argument('--hang', action='store_true', help='Never answer generation requests')
+    parser.add_argument('--block-word', default=None, help='Reject prompts containing this as moderation_blocked')
+    args = parser.parse_args()
+
+    server = StubImageServer((args.host, args.port), args)
+    print(f"Stub image endpoint on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
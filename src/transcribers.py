@@ -0,0 +1,64 @@
+import io
+import settings
+from abc import ABC, abstractmethod
+
+TRANSCRIPTION_PROMPT = "The following is some audio that needs transcription. If you don't know what is being said or if the audio is blank return nothing (an empty result)."
+
+class Transcriber(ABC):
+    """Base class for transcription providers"""
+
+    @abstractmethod
+    def transcribe(self, wav_data: bytes) -> str:
+        """Transcribe a WAV file's contents and return the text"""
+        pass
+
+class OpenAITranscriber(Transcriber):
+    """Transcription with the OpenAI API. The client is kept so its connections are reused"""
+
+    def __init__(self, api_key: str, timeout: float, model: str = "gpt-4o-transcribe"):
+        import openai
+        self.client = openai.OpenAI(api_key=api_key, timeout=timeout, max_retries=0)
+        self.model = model
+
+    def transcribe(self, wav_data: bytes) -> str:
+        transcript = self.client.audio.transcriptions.create(
+            model=self.model,
+            file=("chunk.wav", wav_data),
+            response_format="text",
+            prompt=TRANSCRIPTION_PROMPT
+        )
+        return str(transcript)
+
+class LocalWhisperTranscriber(Transcriber):
+    """Offline transcription on the CPU with faster-whisper (pip install faster-whisper).
+
+    The model is loaded once when the transcriber is created. tiny.en or base.en are the
+    realistic choices on a Pi.
+    """
+
+    def __init__(self, model: str = "tiny.en", threads: int = 4):
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(model, device="cpu", compute_type="int8", cpu_threads=threads)
+
+    def transcribe(self, wav_data: bytes) -> str:
+        segments, info = self.model.transcribe(io.BytesIO(wav_data), beam_size=1)
+        return " ".join(segment.text.strip() for segment in segments)
+
+class StubTranscriber(Transcriber):
+    """Returns the same text for every chunk, for running without a network or a model"""
+
+    def __init__(self, text: str = ""):
+        self.text = text
+
+    def transcribe(self, wav_data: bytes) -> str:
+        return self.text
+
+def create_transcriber(name: str, openai_api_key: str = None, timeout: float = 20) -> Transcriber:
+    """Create the transcriber named by the TRANSCRIBER setting"""
+    if name == "openai":
+        return OpenAITranscriber(openai_api_key, timeout)
+    elif name == "local":
+        return LocalWhisperTranscriber(settings.LOCAL_WHISPER_MODEL, settings.LOCAL_WHISPER_THREADS)
+    elif name == "stub":
+        return StubTranscriber(settings.STUB_TRANSCRIPT)
+    raise ValueError(f"Unknown transcriber: {name}")
@@ -0,0 +1,98 @@
+import collections
+import itertools
+import os
+import threading
+
+MAX_TRANSCRIPT_LINES = 120  # About 1 hour of transcript (15s recordings every ~30s)
+SEGMENT_LINES = 500  # Lines per log file on disk
+
+class TranscriptStore:
+    """The rolling transcript, kept in memory and in an append-only segmented log on disk.
+
+    The last window_lines lines are held in a deque so "last N lines" never touches the disk.
+    Each new line is appended to the newest segment file; nothing is ever rewritten. When a
+    segment fills up a new one is started and segments older than history_lines are deleted,
+    so days of history can be kept without the cost growing with it.
+    """
+
+    def __init__(self, directory, window_lines=MAX_TRANSCRIPT_LINES, history_lines=MAX_TRANSCRIPT_LINES,
+                 segment_lines=SEGMENT_LINES, legacy_file=None):
+        self.directory = directory
+        self.history_lines = max(history_lines, window_lines)
+        self.segment_lines = segment_lines
+        self._lines = collections.deque(maxlen=window_lines)
+        self._lock = threading.Lock()
+        self._segments = collections.OrderedDict()  # segment number -> line count, oldest first
+
+        os.makedirs(directory, exist_ok=True)
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".log"):
+                self._segments[int(name[:-4])] = sum(1 for _ in self._read_segment(int(name[:-4])))
+
+        if len(self._segments) == 0 and legacy_file is not None and os.path.exists(legacy_file):
+            self._migrate(legacy_file)
+
+        self._lines.extend(self._read_last_lines(window_lines))
+
+    def append(self, text):
+        """Add a transcript snippet, which may span several lines"""
+        lines = (str(text) + "\n").splitlines()
+        with self._lock:
+            self._write_lines(lines)
+            self._lines.extend(lines)
+
+    def last_lines(self, num_of_lines):
+        with self._lock:
+            if num_of_lines <= len(self._lines):
+                lines = list(itertools.islice(reversed(self._lines), num_of_lines))
+                lines.reverse()
+                return lines
+            return self._read_last_lines(num_of_lines)
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, "%06d.log" % number)
+
+    def _read_segment(self, number):
+        with open(self._segment_path(number), "r") as f:
+            return f.read().splitlines()
+
+    def _read_last_lines(self, num_of_lines):
+        """Read from the newest segments backwards until we have enough lines"""
+        lines = []
+        for number in reversed(self._segments):
+            lines[:0] = self._read_segment(number)
+            if len(lines) >= num_of_lines:
+                break
+        return lines[-num_of_lines:] if num_of_lines > 0 else []
+
+    def _write_lines(self, lines):
+        while len(lines) > 0:
+            if len(self._segments) == 0 or next(reversed(self._segments.values())) >= self.segment_lines:
+                self._start_segment()
+            number = next(reversed(self._segments))
+            count = min(len(lines), self.segment_lines - self._segments[number])
+            with open(self._segment_path(number), "a") as f:
+                f.write("".join(line + "\n" for line in lines[:count]))
+            self._segments[number] += count
+            lines = lines[count:]
+
+    def _start_segment(self):
+        number = next(reversed(self._segments)) + 1 if len(self._segments) > 0 else 1
+        self._segments[number] = 0
+        self._compact()
+
+    def _compact(self):
+        """Delete the oldest segments that are entirely outside the history we keep"""
+        total = sum(self._segments.values())
+        oldest = next(iter(self._segments))
+        while total - self._segments[oldest] >= self.history_lines:
+            total -= self._segments.pop(oldest)
+            os.remove(self._segment_path(oldest))
+            oldest = next(iter(self._segments))
+
+    def _migrate(self, legacy_file):
+        """Import the old single-file transcript, once"""
+        print(f"Migrating {legacy_file} into {self.directory}")
+        with open(legacy_file, "r") as f:
+            self._write_lines(f.read().splitlines())
+        os.rename(legacy_file, legacy_file + ".migrated")
@@ -0,0 +1,79 @@
+import queue
+import threading
+
+MAX_PENDING_CHUNKS = 4  # Chunks waiting to be transcribed before recording has to wait
+
+class TranscriptionPipeline:
+    """Transcribes recorded chunks on background threads so recording never waits on an upload.
+
+    Several chunks can be transcribed at once, but results are handed to on_transcript one at a
+    time in the order the chunks were submitted. A chunk that fails to transcribe is delivered as
+    None. If on_transcript raises, the pipeline stops and the error is raised from the next
+    submit() so the main loop can restart as before.
+    """
+
+    def __init__(self, transcribe, on_transcript, max_pending=MAX_PENDING_CHUNKS, workers=1):
+        self.transcribe = transcribe
+        self.on_transcript = on_transcript
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._threads = []
+        self._running = False
+        self._error = None
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._next_delivery = 0
+        self._results = {}
+
+    def start(self):
+        self._running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name="transcription-%d" % i, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._running = False
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def submit(self, pcm):
+        """Queue a chunk for transcription, waiting if too many are already pending"""
+        while True:
+            if self._error is not None:
+                raise self._error
+            try:
+                self._queue.put((self._submitted, pcm), timeout=1)
+                break
+            except queue.Full:
+                print("Transcription is behind, waiting to queue chunk...")
+        self._submitted += 1
+        print("%d chunks pending transcription" % self._queue.qsize())
+
+    def _run(self):
+        while self._running:
+            try:
+                sequence, pcm = self._queue.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            try:
+                transcript = self.transcribe(pcm)
+            except Exception as e:
+                print("Transcription failed: ", e)
+                transcript = None
+
+            self._deliver(sequence, transcript)
+
+    def _deliver(self, sequence, transcript):
+        with self._lock:
+            self._results[sequence] = transcript
+            while self._running and self._next_delivery in self._results:
+                transcript = self._results.pop(self._next_delivery)
+                self._next_delivery += 1
+                try:
+                    self.on_transcript(transcript)
+                except Exception as e:
+                    self._error = e
+                    self._running = False
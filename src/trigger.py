@@ -0,0 +1,113 @@
+import collections
+import math
+import re
+import threading
+import time
+import zlib
+
+WINDOW_LINES = 20  # Lines an image is made from
+COMPARE_LINES = 8  # Latest lines compared with them, enough to tell what's being talked about now
+DIMENSIONS = 4096  # Buckets words are hashed into
+DRIFT_THRESHOLD = 0.6  # Cosine distance from the last image's lines that makes a new image due
+MIN_INTERVAL = 180  # Seconds between images however fast the topic changes
+MAX_INTERVAL = 1800  # Seconds before a new image even if the topic hasn't changed
+MIN_LINES = 5  # New lines needed before a new image
+
+WORD = re.compile(r"[a-z][a-z']+")
+
+def vectorize(text, dimensions=DIMENSIONS):
+    """Hashed bag of words: {bucket: count}. crc32 rather than hash() so buckets are the same every run"""
+    counts = collections.Counter()
+    for word in WORD.findall(text.lower()):
+        counts[zlib.crc32(word.encode("utf-8")) % dimensions] += 1
+    return counts
+
+class TopicTrigger:
+    """Decides when the conversation has moved on enough to make a new image.
+
+    Each transcript line becomes a hashed bag-of-words vector, so there's no vocabulary to keep.
+    Words are weighted by inverse document frequency over every line seen, which keeps common words
+    from making all conversations look alike. The latest lines since the last image are compared
+    with the lines that image was made from, and when the cosine distance between them passes
+    threshold a new image is due. min_interval keeps a fast-moving conversation from generating
+    constantly and max_interval makes sure a long conversation on one topic still gets a new image
+    now and then.
+    """
+
+    def __init__(self, threshold=DRIFT_THRESHOLD, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+                 min_lines=MIN_LINES, window_lines=WINDOW_LINES, compare_lines=COMPARE_LINES, clock=time.monotonic):
+        self.threshold = threshold
+        self.compare_lines = compare_lines
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.min_lines = min_lines
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._recent = collections.deque(maxlen=window_lines)
+        self._reference = collections.Counter()  # what the last image was made from
+        self._document_counts = collections.Counter()  # bucket -> lines it appeared in
+        self._documents = 0
+        self._new_lines = 0
+        self._last_fired = clock()
+
+    def seed(self, lines):
+        """Lines an image has just been made from without the trigger, e.g. the startup image"""
+        with self._lock:
+            for line in lines:
+                self._add(line)
+            self._fire()
+
+    def add(self, text):
+        """Add a transcript line, returns True if a new image should be made now"""
+        with self._lock:
+            self._add(text)
+            if self._new_lines < self.min_lines:
+                return False
+            elapsed = self.clock() - self._last_fired
+            if elapsed >= self.max_interval or (elapsed >= self.min_interval and self._drift() >= self.threshold):
+                self._fire()
+                return True
+            return False
+
+    def drift(self):
+        with self._lock:
+            return self._drift()
+
+    def progress(self):
+        """How close a new image is, 0 to 1, for the LEDs"""
+        with self._lock:
+            elapsed = self.clock() - self._last_fired
+            return min(max(self._drift() / self.threshold, elapsed / self.max_interval), 1.0)
+
+    def _add(self, text):
+        vector = vectorize(text)
+        if not vector:
+            return
+        self._document_counts.update(vector.keys())
+        self._documents += 1
+        self._recent.append(vector)
+        self._new_lines += 1
+
+    def _fire(self):
+        self._reference = sum(self._recent, collections.Counter())
+        self._new_lines = 0
+        self._last_fired = self.clock()
+
+    def _weights(self, counts):
+        # smoothed idf, so a bucket in every line still counts a little
+        return {bucket: count * (math.log((1 + self._documents) / (1 + self._document_counts[bucket])) + 1)
+                for bucket, count in counts.items()}
+
+    def _drift(self):
+        """Cosine distance between the latest lines since the last image and the ones it was made from"""
+        new_lines = min(self._new_lines, self.compare_lines, len(self._recent))
+        if new_lines == 0:
+            return 0.0
+        if not self._reference:
+            return 1.0
+        current = sum(list(self._recent)[-new_lines:], collections.Counter())
+        a = self._weights(current)
+        b = self._weights(self._reference)
+        dot = sum(weight * b[bucket] for bucket, weight in a.items() if bucket in b)
+        norm = math.sqrt(sum(w * w for w in a.values())) * math.sqrt(sum(w * w for w in b.values()))
+        return 1.0 - dot / norm if norm else 0.0
@@ -1,49 +1,77 @@
-from flask import Flask, jsonify, render_template, request
-import json
-import random
-import subprocess
-import signal
-import sys
-import os
-import time
+from flask import Flask, abort, jsonify, render_template, request, send_file
+import gzip
 import datetime
 import settings
+from image_db import ImageDB, ImageIndex
+from publisher import AdafruitPublisher
+from events import EventListener, EventPublisher, NEW_IMAGE, JOB_UPDATE
+from broadcast import Broadcaster
+from rotation import RotationScheduler
+from image_cache import ImageCache
+import derivatives
 from Adafruit_IO import Client, Data
 from flask_sock import Sock
 
 app = Flask(__name__)
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = settings.STATIC_MAX_AGE
 sock = Sock(app)
-browser_process = None
-aio = Client(settings.ADAFRUIT_IO_USERNAME, settings.ADAFRUIT_IO_KEY)
+aio = Client(settings.ADAFRUIT_IO_USERNAME, settings.ADAFRUIT_IO_KEY, base_url=settings.ADAFRUIT_IO_BASE_URL)
+publisher = AdafruitPublisher(aio, settings.ADAFRUIT_IO_FEED, settings.ADAFRUIT_IO_MIN_INTERVAL)
+publisher.start()
+image_db = ImageDB(settings.IMAGE_DB_FILE, legacy_file=settings.DB_FILE)
+image_index = ImageIndex(image_db)
+image_cache = ImageCache(settings.IMAGE_CACHE_DIR, settings.IMAGE_CACHE_MAX_MB * 1024 * 1024)
+CACHE_MAX_AGE = 365 * 24 * 60 * 60  # cached images are named by their content so they never change
+GZIP_MIN_SIZE = 256  # smaller responses aren't worth compressing
 
-# Store WebSocket connections
-ws_clients = set()
+# Connected displays
+broadcaster = Broadcaster()
+# Image job callbacks go to main.py, which is waiting for them
+job_events = EventPublisher(settings.JOB_EVENT_SOCKET)
 
-def get_random_url():
-    # set the seed to the same value every 5 minutes so all calls within 5 mins return the same random.choice()
-    random.seed(int(datetime.datetime.now().timestamp()/360))
-    file_path = settings.DB_FILE
-    modification_time = os.path.getmtime(file_path)
+def prefetch_next_image(img):
+    """Start downloading the image the next rotation will show, so the change is instant"""
+    image_cache.prefetch(img['url'])
 
-    try:
-        with open(file_path, "rb") as f:
-            urls = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        urls = []
+# Which image the displays show
+rotation = RotationScheduler(
+    image_index,
+    interval=settings.ROTATION_INTERVAL_SECONDS,
+    latest_hold=datetime.timedelta(minutes=settings.LATEST_IMAGE_HOLD_MINUTES),
+    quiet_start=datetime.time.fromisoformat(settings.QUIET_HOURS_START),
+    quiet_end=datetime.time.fromisoformat(settings.QUIET_HOURS_END),
+    favorites=image_db.favorite_urls,
+    on_advance=prefetch_next_image)
+rotation.start()
 
-    if len(urls) == 0:
-        # No urls
-        return {}
+def localize(img, size=None):
+    """Point an image record at our local copy, or start downloading it and use the remote url for now.
+    size picks one of the resized copies, without it the display gets derivatives.DEFAULT_SIZE
+    """
+    if not img or not img.get('url'):
+        return img
+    entry = image_cache.get(img['url'])
+    if entry is None:
+        image_cache.prefetch(img['url'])
+        return img
+    url = f"/cache/{entry['digest']}"
+    if size is not None:
+        url += f"?size={size}"
+    return dict(img, url=url)
 
-    # return the last one if the file has been changed in the last 30 mins.
-    if time.time() - modification_time <= 30 * 60:
-        return urls[-1]
-    # return a null one if the time is between midnight and 7 am
-    elif datetime.time(0,0) <= datetime.datetime.now().time() <= datetime.time(7,0):
-        return {}
-    # return a random image
-    else:
-        return random.choice(urls)
+@app.after_request
+def compress(response):
+    """gzip JSON responses for clients that accept it"""
+    if response.mimetype != 'application/json' or response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    if 'gzip' not in request.headers.get('Accept-Encoding', ''):
+        return response
+    data = response.get_data()
+    if len(data) >= GZIP_MIN_SIZE:
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
 
 @app.route('/')
 def home():
@@ -51,52 +79,78 @@ def home():
 
 @app.route('/image')
 def image():
-    img = get_random_url()
-    aio.append(settings.ADAFRUIT_IO_FEED, json.dumps(img))
-    return jsonify(img)
+    img = rotation.current()
+    publisher.publish(img)
+    # displays send the width in pixels they draw the image at, so small screens get small files
+    size = None
+    width = request.args.get('width', type=int)
+    if width is not None:
+        size = derivatives.size_for_width(width)
+    return jsonify(localize(img, size))
+
+@app.route('/favorite', methods=['POST'])
+def favorite():
+    data = request.get_json(silent=True) or {}
+    if not image_db.set_favorite(data.get('url'), data.get('favorite', True)):
+        abort(404)
+    rotation.reshuffle()
+    return jsonify({'url': data['url'], 'favorite': data.get('favorite', True)})
+
+@app.route('/jobs/callback/<token>', methods=['POST'])
+def job_callback(token):
+    job = request.get_json(silent=True)
+    if not isinstance(job, dict):
+        abort(400)
+    job_events.publish(JOB_UPDATE, {'token': token, 'job': job})
+    return '', 204
+
+@app.route('/cache/<digest>')
+def cached_image(digest):
+    entry = image_cache.by_digest(digest)
+    if entry is None:
+        abort(404)
+    name, content_type = digest, entry['content_type']
+    size = request.args.get('size', derivatives.DEFAULT_SIZE)
+    if size != derivatives.FULL_SIZE:
+        # the best format the browser says it can show, browsers list image formats when loading images
+        accepted = {value for value, quality in request.accept_mimetypes if quality > 0}
+        variant = derivatives.choose(entry.get('variants', {}), size, accepted)
+        if variant is not None:
+            name, content_type = variant
+    response = send_file(image_cache.path(name), mimetype=content_type)
+    response.set_etag(name)
+    response.vary.add('Accept')
+    response.cache_control.public = True
+    response.cache_control.max_age = CACHE_MAX_AGE
+    return response.make_conditional(request)
 
 @sock.route('/ws')
 def ws(ws):
-    ws_clients.add(ws)
+    # messages are written by the channel's own thread, this one just waits for the socket to close
+    channel = broadcaster.add(ws)
     try:
         while True:
-            # Keep connection alive and wait for new images
             ws.receive()
     except:
-        ws_clients.remove(ws)
+        pass
+    finally:
+        channel.close()
 
-def notify_clients(data):
-    """Notify all WebSocket clients of new image data"""
-    dead_clients = set()
-    for client in ws_clients:
+def handle_event(event):
+    """Events from main.py / generate.py: new images and pipeline state, passed on to the displays"""
+    if event["event"] == NEW_IMAGE:
+        image_index.invalidate()
+        # download it once now, so every display loads it from us
         try:
-            client.send(json.dumps(data))
-        except:
-            dead_clients.add(client)
-    
-    # Clean up dead connections
-    for client in dead_clients:
-        ws_clients.remove(client)
-
-def signal_handler(sig, frame):
-    print('Stopping Flask app and closing browser')
-    browser_process.terminate()
-    sys.exit(0)
+            image_cache.fetch(event["data"]["url"])
+        except Exception as e:
+            print(f"Warning: Failed to cache new image: {e}")
+        event = dict(event, data=localize(event["data"]))
+    broadcaster.broadcast(event)
 
-@app.route('/_internal/notify_new_image', methods=['POST'])
-def handle_new_image_notification():
-    """Internal endpoint for receiving new image notifications from generate.py"""
-    if not request.is_json:
-        return jsonify({"error": "Content-Type must be application/json"}), 400
-    
-    data = request.json
-    notify_clients(data)
-    return jsonify({"status": "notified"}), 200
+event_listener = EventListener(settings.EVENT_SOCKET, handle_event)
+event_listener.start()
 
 if __name__ == '__main__':
-    if settings.START_BROWSER:
-        # Start the browser in kiosk mode
-        browser_process = subprocess.Popen(['chromium', '-kiosk', 'http://localhost:5000'])
-        signal.signal(signal.SIGINT, signal_handler)
-        signal.signal(signal.SIGTERM, signal_handler)
-    app.run(host="0.0.0.0", debug=True)
+    # for development, serve.py runs the viewer on the displays
+    app.run(host=settings.VIEW_HOST, port=settings.VIEW_PORT, debug=True, use_reloader=False)
@@ -0,0 +1,143 @@
+import collections
+import time
+import warnings
+from pcm import frame_bytes
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        import audioop
+except ImportError:  # removed in Python 3.13
+    audioop = None
+
+RUNNING_SUM_COUNT = 5  # Looking at 5 frames (150ms at 30ms per frame)
+GATE_MARGIN = 1.5  # Frames quieter than this multiple of the noise floor skip the VAD
+MIN_NOISE_FLOOR = 10.0  # Level; keeps the gate from opening on every frame after digital silence
+HANGOVER_FRAMES = 10  # Frames after speech that always go to the VAD (300ms at 30ms per frame)
+
+class EnergyGate:
+    """A cheap level check that runs before webrtcvad, with a noise floor that adapts to the room.
+
+    The level is audioop's RMS, computed in C; a level worked out in Python costs more than the VAD
+    it would skip, so without audioop (removed in Python 3.13) there is no gate. The floor follows
+    quiet frames quickly and loud non-speech frames slowly, and is never updated from speech, so a
+    long conversation does not raise it. For hangover frames after speech every frame goes to the
+    VAD, so quiet word endings and pauses between words are not gated away.
+    """
+
+    def __init__(self, margin=GATE_MARGIN, hangover=HANGOVER_FRAMES):
+        self.margin = margin
+        self.hangover = hangover
+        self.noise_floor = None
+        self._hangover_left = 0
+
+    @staticmethod
+    def available():
+        return audioop is not None
+
+    @staticmethod
+    def level(data):
+        """RMS of a frame of raw 16-bit PCM bytes"""
+        return audioop.rms(data, 2)
+
+    def is_quiet(self, level):
+        if self._hangover_left > 0:
+            self._hangover_left -= 1
+            return False
+        if self.noise_floor is None:
+            return False
+        return level < self.noise_floor * self.margin
+
+    def heard_speech(self):
+        self._hangover_left = self.hangover
+
+    def update(self, level):
+        """Feed the level of a frame that was not speech into the noise floor"""
+        if self.noise_floor is None:
+            self.noise_floor = max(level, MIN_NOISE_FLOOR)
+            return
+        rate = 0.1 if level < self.noise_floor else 0.01
+        self.noise_floor = max(MIN_NOISE_FLOOR, self.noise_floor + rate * (level - self.noise_floor))
+
+class VoiceDetector:
+    """Runs webrtcvad over every captured frame, at the rate the frames arrive.
+
+    Frames are read batch_frames at a time, so a larger batch means fewer wakeups at the cost of
+    up to one batch of extra latency. Speech is detected once window_frames frames in a row are
+    speech. Detection latency (from the triggering frame being captured to it being detected) is
+    tracked so aggressiveness, window and batch size can be tuned.
+    """
+
+    def __init__(self, vad, sample_rate, window_frames=RUNNING_SUM_COUNT, batch_frames=1, preroll_ms=0, gate=None):
+        self.vad = vad
+        self.sample_rate = sample_rate
+        self.window_frames = window_frames
+        self.batch_frames = batch_frames
+        self.preroll_ms = preroll_ms
+        self.gate = gate
+        self.frames_processed = 0
+        self.frames_gated = 0
+        self.detections = 0
+        self.last_latency = None
+        self.total_latency = 0.0
+
+    def is_speech(self, pcm):
+        self.frames_processed += 1
+        if self.gate is None:
+            return self.vad.is_speech(frame_bytes(pcm), self.sample_rate)
+
+        data = frame_bytes(pcm)
+        level = self.gate.level(data)
+        if self.gate.is_quiet(level):
+            self.frames_gated += 1
+            self.gate.update(level)
+            return False
+
+        speech = self.vad.is_speech(data, self.sample_rate)
+        if speech:
+            self.gate.heard_speech()
+        else:
+            self.gate.update(level)
+        return speech
+
+    def wait(self, reader):
+        """Wait until speech is detected and return the pre-roll: the frames leading up to and
+        including the ones that triggered detection"""
+        print("Listening...")
+        running_values = collections.deque([0] * self.window_frames, maxlen=self.window_frames)
+        # always keep at least the frames that triggered detection
+        preroll_frames = max(self.window_frames, int(self.preroll_ms * self.sample_rate / 1000 / reader.frame_length))
+        preroll = collections.deque(maxlen=preroll_frames)
+
+        while True:
+            frames = reader.read_batch(self.batch_frames)
+            for i, pcm in enumerate(frames):
+                preroll.append(pcm)
+                running_values.append(1 if self.is_speech(pcm) else 0)
+
+                if sum(running_values) == self.window_frames:  # All frames must be speech
+                    # frames after the trigger in this batch belong to the recording, not the pre-roll
+                    remaining = frames[i + 1:]
+                    frame_seconds = reader.frame_length / self.sample_rate
+                    self._record_latency(reader.capture_time, len(remaining) * frame_seconds)
+                    print("\nVoice detected! Starting recording... (latency %dms)" % (self.last_latency * 1000))
+                    if self.gate is not None:
+                        # no floor yet if every frame so far was speech
+                        floor = "none yet" if self.gate.noise_floor is None else "%.0f" % self.gate.noise_floor
+                        print("Energy gate skipped VAD on %d of %d frames (noise floor %s)" % (
+                            self.frames_gated, self.frames_processed, floor))
+                    return list(preroll) + remaining
+
+    def _record_latency(self, capture_time, trailing_seconds):
+        if capture_time is None:
+            self.last_latency = 0.0
+        else:
+            # capture_time is for the last frame of the batch, the trigger was captured before that
+            self.last_latency = max(0.0, time.monotonic() - capture_time + trailing_seconds)
+        self.detections += 1
+        self.total_latency += self.last_latency
+
+    def average_latency(self):
+        if self.detections == 0:
+            return None
+        return self.total_latency / self.detections